@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Entity Memory Benchmark
+=======================
+Measures how much memory the parsed entity table takes, comparing the
+compact StepEntity (__slots__, text stored once, array references) with the
+previous dict-based layout (content and full_line stored separately, a set
+of references per entity).
+
+Usage:
+    python3 benchmarks/bench_entity_memory.py [input.stp]
+
+Defaults to the bundled 2025_03_20_Spatial_InterOp_3D.stp.
+"""
+
+import io
+import os
+import re
+import sys
+import gc
+import time
+import tracemalloc
+from collections import OrderedDict
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from step_splitter import StepEntity, StepParser, StepTokenizer  # noqa: E402
+
+DEFAULT_INPUT = os.path.join(REPO_DIR, "2025_03_20_Spatial_InterOp_3D.stp")
+
+
+class LegacyStepEntity:
+    """The previous StepEntity layout, kept here only for comparison."""
+
+    def __init__(self, entity_id, entity_type, content, full_line):
+        self.id = entity_id
+        self.type = entity_type
+        self.content = content
+        self.full_line = full_line
+        refs = set()
+        for match in re.finditer(r'#(\d+)', full_line):
+            refs.add(int(match.group(1)))
+        refs.discard(entity_id)
+        self.references = refs
+
+    @classmethod
+    def from_line(cls, line):
+        match = re.match(r'#(\d+)\s*=\s*([A-Z_0-9]+)\s*\((.*)\)\s*;', line, re.DOTALL)
+        if match:
+            return cls(int(match.group(1)), match.group(2), match.group(3), line)
+        match = re.match(r'#(\d+)\s*=\s*\((.*)\)\s*;', line, re.DOTALL)
+        if match:
+            content = match.group(2)
+            type_match = re.search(r'([A-Z_0-9]+)', content)
+            entity_type = type_match.group(1) if type_match else "COMPLEX"
+            return cls(int(match.group(1)), entity_type, content, line)
+        return None
+
+
+def read_entity_lines(filepath):
+    """Return the single-line entity instances of a STEP file."""
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    return [StepParser._join_lines(statement)
+            for statement in StepTokenizer().statements(io.StringIO(text))
+            if statement.startswith('#')]
+
+
+def measure(label, build):
+    """Run build() under tracemalloc and return (label, bytes retained, seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return label, retained, elapsed
+
+
+def build_table(entity_class, lines):
+    # Copy each line so the table owns its text, as it does after parsing a file
+    table = OrderedDict()
+    for line in lines:
+        entity = entity_class.from_line(''.join(line))
+        if entity:
+            table[entity.id] = entity
+    return table
+
+
+def parse_file(filepath, lazy):
+    parser = StepParser(lazy=lazy)
+    parser.parse(filepath)
+    return parser
+
+
+def main():
+    filepath = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_INPUT
+    lines = read_entity_lines(filepath)
+
+    print(f"Input: {os.path.basename(filepath)} ({os.path.getsize(filepath) / 1e6:.2f} MB, "
+          f"{len(lines)} entities)")
+    print()
+
+    results = [
+        measure("Entity table, previous layout", lambda: build_table(LegacyStepEntity, lines)),
+        measure("Entity table, compact layout", lambda: build_table(StepEntity, lines)),
+        measure("StepParser.parse (with indexes)", lambda: parse_file(filepath, lazy=False)),
+        measure("StepParser.parse --lazy", lambda: parse_file(filepath, lazy=True)),
+    ]
+
+    baseline = results[0][1]
+    print(f"{'Measurement':<34} {'Memory':>10} {'Per entity':>11} {'vs previous':>12} {'Time':>8}")
+    for label, retained, elapsed in results:
+        per_entity = retained / max(len(lines), 1)
+        print(f"{label:<34} {retained / 1e6:>8.2f}MB {per_entity:>9.0f} B "
+              f"{retained / baseline:>11.0%} {elapsed:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Occurrence Counting Benchmark
+=============================
+Times StepSplitter._compute_recursive_counts (one topological pass over the
+NAUO DAG) against the previous per-leaf recursive walk on synthetic assembly
+structures.
+
+The recursive walk visits every root-to-node path once per leaf, so its work
+grows with the number of paths, not NAUOs. It is skipped when that estimated
+work is above LEGACY_MAX_STEPS; on deep shared assemblies it would not finish.
+
+Usage:
+    python3 benchmarks/bench_occurrence_counting.py [nodes] [levels]
+
+Defaults to a 10,000-node, 50-level assembly.
+"""
+
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from step_splitter import StepSplitter  # noqa: E402
+
+# Most child visits (estimated by legacy_walk_steps) the recursive walk is run for;
+# about 6 seconds
+LEGACY_MAX_STEPS = 50_000_000
+
+
+def legacy_recursive_counts(children_map, root_pd):
+    """The previous algorithm, kept here only for comparison."""
+    leaf_counts = {}
+
+    def _count_leaf(target_pd, context_pd):
+        total = 0
+        for child_pd in children_map.get(context_pd, []):
+            if child_pd == target_pd:
+                total += 1
+            else:
+                total += _count_leaf(target_pd, child_pd)
+        return total
+
+    all_pds = set()
+    for parent, children in children_map.items():
+        all_pds.add(parent)
+        all_pds.update(children)
+    for leaf_pd in {pd for pd in all_pds if pd not in children_map}:
+        count = _count_leaf(leaf_pd, root_pd)
+        if count > 0:
+            leaf_counts[leaf_pd] = count
+    return leaf_counts
+
+
+def legacy_walk_steps(children_map, root_pd):
+    """Estimate the child visits of legacy_recursive_counts without running it.
+
+    Each leaf's walk enters every PD once per root-to-PD path and visits its
+    children, so the work is leaves * sum(paths(pd) * children(pd)). Paths are
+    counted in one topological pass.
+    """
+    in_degree = {}
+    for children in children_map.values():
+        for child in children:
+            in_degree[child] = in_degree.get(child, 0) + 1
+    paths = {root_pd: 1}
+    order = [root_pd]
+    for pd in order:
+        for child in children_map.get(pd, ()):
+            paths[child] = paths.get(child, 0) + paths[pd]
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                order.append(child)
+    leaves = {child for children in children_map.values() for child in children if child not in children_map}
+    return len(leaves) * sum(paths[pd] * len(children_map.get(pd, ())) for pd in order)
+
+
+def build_assembly(nodes, levels, fan_out=3, seed=1):
+    """Return (children_map, root_pd) of a layered DAG of sub-assemblies sharing parts.
+
+    Level 0 is the root. Each PD on the other levels is placed one to fan_out
+    times into random PDs of the level above, and every PD of the last level is
+    a leaf part. A few PDs of the inner levels are leaves as well.
+    """
+    rng = random.Random(seed)
+    per_level = max(1, (nodes - 1) // max(levels, 1))
+    layers = [[1]]
+    next_id = 2
+    for _ in range(levels):
+        layers.append(list(range(next_id, next_id + per_level)))
+        next_id += per_level
+
+    children_map = {}
+    for depth in range(1, len(layers)):
+        parents = [pd for pd in layers[depth - 1] if depth == 1 or pd % 7]
+        for pd in layers[depth]:
+            for _ in range(rng.randint(1, fan_out)):
+                children_map.setdefault(rng.choice(parents), []).append(pd)
+    return children_map, 1
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    levels = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    splitter = StepSplitter()
+
+    cases = [(200, 5), (1000, 8), (nodes, levels)]
+    print(f"{'Assembly':<22} {'NAUOs':>8} {'Leaves':>7} {'Recursive':>11} {'Topological':>12}")
+    for case_nodes, case_levels in cases:
+        children_map, root_pd = build_assembly(case_nodes, case_levels)
+        nauos = sum(len(children) for children in children_map.values())
+        counts, linear_time = time_call(splitter._compute_recursive_counts, children_map, root_pd)
+
+        legacy = "skipped"
+        if legacy_walk_steps(children_map, root_pd) <= LEGACY_MAX_STEPS:
+            legacy_counts, legacy_time = time_call(legacy_recursive_counts, children_map, root_pd)
+            assert legacy_counts == counts, "counts differ from the recursive walk"
+            legacy = f"{legacy_time:.3f}s"
+
+        label = f"{case_nodes} nodes, {case_levels} levels"
+        print(f"{label:<22} {nauos:>8} {len(counts):>7} {legacy:>11} {linear_time:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
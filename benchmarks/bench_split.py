@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Split Benchmark
+===============
+Splits synthetic assemblies from generate_assembly.py and times the parse,
+detect (product structure and styled item indexes, assembly tree, occurrence
+counts, finding solids), hash (signature and geometry hash) and write phases
+separately, using the phase timings that --profile records. Each case runs
+--repeat times and the fastest run counts.
+
+Results can be saved as a baseline and later runs compared against it; a
+phase that got slower than the baseline by more than --threshold (and by at
+least --min-seconds) is reported as a regression and the exit status is 1.
+
+Usage:
+    python3 benchmarks/bench_split.py [--cases small,medium,...] [--repeat N]
+        [--save baseline.json] [--compare baseline.json] [--hash MODE] [--lazy] [--jobs N]
+
+Cases (see CASES): small, medium, multi-volume, styled and large
+(about 1.9 million entities; not run by default).
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_assembly import AssemblyGenerator  # noqa: E402
+from step_splitter import StepSplitter  # noqa: E402
+
+CASES = {
+    "small": dict(parts=200, depth=3, solids=1),
+    "medium": dict(parts=2000, depth=4, solids=2),
+    "multi-volume": dict(parts=2000, depth=0, solids=1, duplicate_ratio=0.3),
+    "styled": dict(parts=500, depth=3, solids=2, styled_density=1.0, schema="ap203"),
+    "large": dict(parts=10000, depth=5, solids=1),
+}
+DEFAULT_CASES = ("small", "medium", "multi-volume", "styled")
+
+# Benchmark phase -> profiler phases it is made of
+PHASES = {
+    "parse": ("parse",),
+    "detect": ("product_structure", "styled_items", "assembly_tree", "occurrence_counts", "find_solids"),
+    "hash": ("signature", "geometry_hash"),
+    "write": ("export",),
+}
+
+
+def generate_input(data_dir, name, params):
+    """Write the case's input file unless an identical one is already there."""
+    tag = "-".join(f"{key}{value}" for key, value in sorted(params.items()))
+    path = os.path.join(data_dir, f"{name}-{tag}.stp")
+    if not os.path.exists(path):
+        with open(path + ".tmp", 'w', encoding='utf-8', buffering=1 << 20) as f:
+            AssemblyGenerator(**params).write(f)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_split(input_path, splitter_options):
+    """Split input_path into a temporary directory and return phase -> wall seconds, entities."""
+    splitter = StepSplitter(**splitter_options)
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        splitter.split(input_path, output_dir)
+        total = time.perf_counter() - start
+    phases = splitter.profiler.phases
+    timings = {phase: sum(phases[name]["wall_seconds"] for name in names if name in phases)
+               for phase, names in PHASES.items()}
+    timings["total"] = total
+    return timings, len(splitter.parser.entities)
+
+
+def run_case(data_dir, name, repeat, splitter_options):
+    params = CASES[name]
+    input_path = generate_input(data_dir, name, params)
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        timings, entities = run_split(input_path, splitter_options)
+        best = timings if best is None else {phase: min(best[phase], timings[phase]) for phase in best}
+    return {"params": params, "entities": entities, "bytes": os.path.getsize(input_path), "seconds": best}
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """Return (case, phase, baseline seconds, seconds) for every regressed phase."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None or previous["params"] != result["params"]:
+            continue
+        for phase, seconds in result["seconds"].items():
+            before = previous["seconds"].get(phase)
+            if before is not None and seconds > before * (1 + threshold) and seconds - before >= min_seconds:
+                regressions.append((name, phase, before, seconds))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark splitting synthetic assemblies.")
+    arg_parser.add_argument("--cases", default=",".join(DEFAULT_CASES),
+                            help=f"Comma-separated cases from: {', '.join(CASES)}")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--data-dir", help="Where generated inputs are kept (default: a temporary directory)")
+    arg_parser.add_argument("--save", metavar="FILE", help="Save the results as a baseline")
+    arg_parser.add_argument("--compare", metavar="FILE", help="Compare against a saved baseline")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="Relative slowdown reported as a regression (default 0.25)")
+    arg_parser.add_argument("--min-seconds", type=float, default=0.05,
+                            help="Ignore slowdowns smaller than this (default 0.05)")
+    arg_parser.add_argument("--hash", choices=sorted(StepSplitter.HASH_MODES), default="flat")
+    arg_parser.add_argument("--lazy", action="store_true")
+    arg_parser.add_argument("--jobs", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        arg_parser.error(f"unknown case(s): {', '.join(unknown)}")
+    splitter_options = dict(lazy=args.lazy, jobs=args.jobs, hash_mode=args.hash)
+
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(data_dir, exist_ok=True)
+
+        columns = list(PHASES) + ["total"]
+        print(f"{'Case':<14} {'Entities':>10} " + " ".join(f"{phase:>8}" for phase in columns))
+        results = {}
+        for name in names:
+            result = results[name] = run_case(data_dir, name, args.repeat, splitter_options)
+            print(f"{name:<14} {result['entities']:>10} "
+                  + " ".join(f"{result['seconds'][phase]:>7.3f}s" for phase in columns), flush=True)
+
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "options": splitter_options,
+        "cases": results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=1)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("options") != splitter_options:
+            print(f"\nNote: baseline was run with {baseline.get('options')}")
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for name, phase, before, seconds in regressions:
+                print(f"  {name} {phase}: {before:.3f}s -> {seconds:.3f}s ({seconds / before - 1:+.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
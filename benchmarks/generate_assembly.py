@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Synthetic STEP Assembly Generator
+=================================
+Writes AP203 or AP214 STEP files with box-shaped solids in a NAUO assembly
+tree, for benchmarking. The file is written entity by entity, so inputs with
+millions of entities can be generated with little memory.
+
+Parameters:
+    parts            leaf products (each one PRODUCT_DEFINITION)
+    depth            levels of sub-assemblies above the parts; 0 writes a single
+                     multi-volume part with all solids instead of an assembly
+    fanout           children per sub-assembly
+    solids           solids per part
+    duplicate_ratio  fraction of the solids that are exact copies of another
+                     solid of the same part (or of the file, with depth 0), so
+                     duplicate detection has something to merge
+    styled_density   fraction of faces with their own STYLED_ITEM colour (every
+                     solid gets one STYLED_ITEM as well)
+
+Usage:
+    python3 benchmarks/generate_assembly.py output.stp [--parts N] [--depth N] ...
+"""
+
+import argparse
+import random
+import sys
+
+SCHEMAS = {
+    "ap203": ("CONFIG_CONTROL_DESIGN", "config_control_design", 1994,
+              "configuration controlled 3d designs of mechanical parts and assemblies"),
+    "ap214": ("AUTOMOTIVE_DESIGN { 1 0 10303 214 3 1 1 }", "automotive_design", 2010,
+              "core data for automotive mechanical design processes"),
+}
+
+
+class EntityWriter:
+    """Numbers entity instances and writes them straight to a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def add(self, body):
+        self.count += 1
+        self.stream.write(f"#{self.count}={body};\n")
+        return self.count
+
+    def add_complex(self, body):
+        self.count += 1
+        self.stream.write(f"#{self.count}=({body});\n")
+        return self.count
+
+
+class AssemblyGenerator:
+    """Generates one synthetic file; see the module docstring for the parameters."""
+
+    def __init__(self, parts=100, depth=3, fanout=8, solids=1, duplicate_ratio=0.2,
+                 styled_density=0.5, schema="ap214", seed=1):
+        self.parts = parts
+        self.depth = depth
+        self.fanout = max(fanout, 1)
+        self.solids = max(solids, 1)
+        self.duplicate_ratio = duplicate_ratio
+        self.styled_density = styled_density
+        self.schema = schema
+        self.random = random.Random(seed)
+
+    def write(self, stream):
+        """Write the file and return the number of entities."""
+        schema, protocol, year, application = SCHEMAS[self.schema]
+        stream.write("ISO-10303-21;\nHEADER;\n")
+        stream.write("FILE_DESCRIPTION(('synthetic benchmark assembly'),'2;1');\n")
+        stream.write("FILE_NAME('synthetic','2026-01-01T00:00:00',(''),(''),'generate_assembly','','');\n")
+        stream.write(f"FILE_SCHEMA(('{schema}'));\nENDSEC;\nDATA;\n")
+
+        out = self.out = EntityWriter(stream)
+        app = out.add(f"APPLICATION_CONTEXT('{application}')")
+        out.add(f"APPLICATION_PROTOCOL_DEFINITION('international standard','{protocol}',{year},#{app})")
+        self.product_context = out.add(f"PRODUCT_CONTEXT('',#{app},'mechanical')")
+        self.pd_context = out.add(f"PRODUCT_DEFINITION_CONTEXT('part definition',#{app},'design')")
+        length = out.add_complex("LENGTH_UNIT() NAMED_UNIT(*) SI_UNIT(.MILLI.,.METRE.)")
+        angle = out.add_complex("NAMED_UNIT(*) PLANE_ANGLE_UNIT() SI_UNIT($,.RADIAN.)")
+        solid_angle = out.add_complex("NAMED_UNIT(*) SI_UNIT($,.STERADIAN.) SOLID_ANGLE_UNIT()")
+        uncertainty = out.add(f"UNCERTAINTY_MEASURE_WITH_UNIT(LENGTH_MEASURE(1.E-05),#{length},"
+                              f"'distance_accuracy_value','confusion accuracy')")
+        self.context = out.add_complex(
+            f"GEOMETRIC_REPRESENTATION_CONTEXT(3) GLOBAL_UNCERTAINTY_ASSIGNED_CONTEXT((#{uncertainty})) "
+            f"GLOBAL_UNIT_ASSIGNED_CONTEXT((#{length},#{angle},#{solid_angle})) "
+            f"REPRESENTATION_CONTEXT('Context #1','3D Context with UNIT and UNCERTAINTY')")
+        self.colours = [out.add(f"COLOUR_RGB('',{self.random.random():.3f},{self.random.random():.3f},"
+                                f"{self.random.random():.3f})") for _ in range(8)]
+        self.styled_items = []
+
+        if self.depth <= 0:
+            self._write_multi_volume_part()
+        else:
+            self._write_assembly()
+
+        if self.styled_items:
+            out.add("MECHANICAL_DESIGN_GEOMETRIC_PRESENTATION_REPRESENTATION('',(%s),#%d)"
+                    % (",".join(f"#{item}" for item in self.styled_items), self.context))
+        stream.write("ENDSEC;\nEND-ISO-10303-21;\n")
+        return out.count
+
+    def _write_multi_volume_part(self):
+        _, pds = self._product("SYNTHETIC-PART")
+        solids = self._solids("VOLUME", self.parts * self.solids)
+        self._shape(pds, solids)
+
+    def _write_assembly(self):
+        level = []
+        for index in range(self.parts):
+            name = f"PART-{index}"
+            pd, pds = self._product(name)
+            self._shape(pds, self._solids(name, self.solids))
+            level.append(pd)
+
+        for depth in range(self.depth):
+            groups = max(1, len(level) // self.fanout) if depth < self.depth - 1 else 1
+            parents = []
+            for group in range(groups):
+                pd, pds = self._product(f"ASM-{depth}-{group}")
+                representation = self.out.add(f"SHAPE_REPRESENTATION('',(),#{self.context})")
+                self.out.add(f"SHAPE_DEFINITION_REPRESENTATION(#{pds},#{representation})")
+                parents.append(pd)
+            for index, child in enumerate(level):
+                parent = parents[index % len(parents)]
+                for occurrence in range(self.random.randint(1, 3)):
+                    self.out.add(f"NEXT_ASSEMBLY_USAGE_OCCURRENCE('{child}-{occurrence}','','',"
+                                 f"#{parent},#{child},$)")
+            level = parents
+
+    def _product(self, name):
+        out = self.out
+        product = out.add(f"PRODUCT('{name}','{name}','',(#{self.product_context}))")
+        formation = out.add(f"PRODUCT_DEFINITION_FORMATION('','',#{product})")
+        pd = out.add(f"PRODUCT_DEFINITION('design','',#{formation},#{self.pd_context})")
+        pds = out.add(f"PRODUCT_DEFINITION_SHAPE('','',#{pd})")
+        return pd, pds
+
+    def _shape(self, pds, solids):
+        brep = self.out.add("ADVANCED_BREP_SHAPE_REPRESENTATION('',(%s),#%d)"
+                            % (",".join(f"#{solid}" for solid in solids), self.context))
+        self.out.add(f"SHAPE_DEFINITION_REPRESENTATION(#{pds},#{brep})")
+
+    def _solids(self, name, count):
+        solids = []
+        shapes = []
+        for index in range(count):
+            if shapes and self.random.random() < self.duplicate_ratio:
+                shape = self.random.choice(shapes)
+            else:
+                shape = (self.random.uniform(0, 1000), self.random.uniform(0, 1000),
+                         self.random.uniform(0, 1000), self.random.uniform(1, 50))
+                shapes.append(shape)
+            solid_name = name if count == 1 else f"{name}-S{index}"
+            solids.append(self._box(solid_name, *shape))
+        return solids
+
+    def _box(self, name, x, y, z, size):
+        """Write a MANIFOLD_SOLID_BREP cube with corner (x, y, z) and return its ID."""
+        out = self.out
+        vertices = {}
+        for corner in ((i, j, k) for i in (0, 1) for j in (0, 1) for k in (0, 1)):
+            point = out.add("CARTESIAN_POINT('',(%.6E,%.6E,%.6E))"
+                            % (x + corner[0] * size, y + corner[1] * size, z + corner[2] * size))
+            vertices[corner] = out.add(f"VERTEX_POINT('',#{point})")
+
+        edges = {}
+        faces = []
+        for axis in range(3):
+            for side in (0, 1):
+                corners = []
+                for u, w in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                    corner = [0, 0, 0]
+                    corner[axis] = side
+                    corner[(axis + 1) % 3] = u
+                    corner[(axis + 2) % 3] = w
+                    corners.append(tuple(corner))
+                oriented = []
+                for start, end in zip(corners, corners[1:] + corners[:1]):
+                    key = tuple(sorted((start, end)))
+                    if key not in edges:
+                        edges[key] = self._edge(vertices, key, x, y, z, size)
+                    oriented.append(out.add(f"ORIENTED_EDGE('',*,*,#{edges[key]},.T.)"))
+                loop = out.add("EDGE_LOOP('',(%s))" % ",".join(f"#{edge}" for edge in oriented))
+                bound = out.add(f"FACE_OUTER_BOUND('',#{loop},.T.)")
+                origin = [x, y, z]
+                origin[axis] += side * size
+                location = out.add("CARTESIAN_POINT('',(%.6E,%.6E,%.6E))" % tuple(origin))
+                normal = [0.0, 0.0, 0.0]
+                normal[axis] = 1.0
+                reference = [0.0, 0.0, 0.0]
+                reference[(axis + 1) % 3] = 1.0
+                normal_dir = out.add("DIRECTION('',(%.1f,%.1f,%.1f))" % tuple(normal))
+                reference_dir = out.add("DIRECTION('',(%.1f,%.1f,%.1f))" % tuple(reference))
+                placement = out.add(f"AXIS2_PLACEMENT_3D('',#{location},#{normal_dir},#{reference_dir})")
+                plane = out.add(f"PLANE('',#{placement})")
+                face = out.add(f"ADVANCED_FACE('',(#{bound}),#{plane},.T.)")
+                faces.append(face)
+                if self.random.random() < self.styled_density:
+                    self._style(face)
+
+        shell = out.add("CLOSED_SHELL('',(%s))" % ",".join(f"#{face}" for face in faces))
+        solid = out.add(f"MANIFOLD_SOLID_BREP('{name}',#{shell})")
+        self._style(solid)
+        return solid
+
+    def _edge(self, vertices, key, x, y, z, size):
+        out = self.out
+        start, end = key
+        direction = out.add("DIRECTION('',(%.1f,%.1f,%.1f))" % tuple(e - s for s, e in zip(start, end)))
+        vector = out.add(f"VECTOR('',#{direction},{size:.6E})")
+        point = out.add("CARTESIAN_POINT('',(%.6E,%.6E,%.6E))"
+                        % (x + start[0] * size, y + start[1] * size, z + start[2] * size))
+        line = out.add(f"LINE('',#{point},#{vector})")
+        return out.add(f"EDGE_CURVE('',#{vertices[start]},#{vertices[end]},#{line},.T.)")
+
+    def _style(self, item):
+        out = self.out
+        colour = self.random.choice(self.colours)
+        fill_colour = out.add(f"FILL_AREA_STYLE_COLOUR('',#{colour})")
+        fill = out.add(f"FILL_AREA_STYLE('',(#{fill_colour}))")
+        area = out.add(f"SURFACE_STYLE_FILL_AREA(#{fill})")
+        side = out.add(f"SURFACE_SIDE_STYLE('',(#{area}))")
+        usage = out.add(f"SURFACE_STYLE_USAGE(.BOTH.,#{side})")
+        assignment = out.add(f"PRESENTATION_STYLE_ASSIGNMENT((#{usage}))")
+        self.styled_items.append(out.add(f"STYLED_ITEM('color',(#{assignment}),#{item})"))
+
+
+def add_arguments(arg_parser):
+    """Add the generator parameters to an argparse parser."""
+    arg_parser.add_argument("--parts", type=int, default=100, help="Leaf parts (default 100)")
+    arg_parser.add_argument("--depth", type=int, default=3,
+                            help="Sub-assembly levels; 0 writes one multi-volume part (default 3)")
+    arg_parser.add_argument("--fanout", type=int, default=8, help="Children per sub-assembly (default 8)")
+    arg_parser.add_argument("--solids", type=int, default=1, help="Solids per part (default 1)")
+    arg_parser.add_argument("--duplicate-ratio", type=float, default=0.2,
+                            help="Fraction of solids copied from another solid (default 0.2)")
+    arg_parser.add_argument("--styled-density", type=float, default=0.5,
+                            help="Fraction of faces with their own colour (default 0.5)")
+    arg_parser.add_argument("--schema", choices=sorted(SCHEMAS), default="ap214")
+    arg_parser.add_argument("--seed", type=int, default=1)
+
+
+def generator_from_args(args):
+    return AssemblyGenerator(parts=args.parts, depth=args.depth, fanout=args.fanout, solids=args.solids,
+                             duplicate_ratio=args.duplicate_ratio, styled_density=args.styled_density,
+                             schema=args.schema, seed=args.seed)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic STEP assembly for benchmarks.")
+    arg_parser.add_argument("output", help="Output .stp path ('-' for stdout)")
+    add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    generator = generator_from_args(args)
+    if args.output == "-":
+        count = generator.write(sys.stdout)
+    else:
+        with open(args.output, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            count = generator.write(f)
+    print(f"Wrote {count} entities", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,208 +16,1261 @@ Usage:
 Author: Anirudha
 """
 
+import io
 import re
+import glob
+import fnmatch
+import time
+import queue
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
 import os
 import sys
+import mmap
+import multiprocessing
 import hashlib
+import json
+import pickle
+import gzip
+import shutil
+import stat
+import tarfile
+import tempfile
+import zipfile
+import cProfile
+from array import array
+from bisect import bisect_left
 from datetime import datetime
 from collections import OrderedDict
-from typing import Dict, Set, List, Tuple, Optional
+from collections.abc import Mapping
+from contextlib import contextmanager, redirect_stdout
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+from typing import (Dict, Set, List, Tuple, Optional, Iterator, Iterable, TextIO, Sequence,
+                    AbstractSet, FrozenSet, NamedTuple, Callable)
 
 
 class StepEntity:
-    """Represents a STEP entity with its ID, type, and content."""
+    """Represents a STEP entity with its ID, type, and content.
 
-    def __init__(self, entity_id: int, entity_type: str, content: str, full_line: str):
+    The entity text is stored once (full_line); content is sliced out of it on
+    demand. References are kept in file order in a compact array, together with
+    the (start, end) offsets of every #id occurrence in full_line, so the line
+    can be renumbered by splicing.
+    """
+
+    __slots__ = ('id', 'type', 'full_line', 'references', 'reference_spans', '_content_start')
+
+    _DIGITS = '0123456789'
+
+    _TYPE_NAME = re.compile(r'([A-Z_0-9]+)')
+
+    def __init__(self, entity_id: int, entity_type: str, full_line: str, content_start: int):
         self.id = entity_id
-        self.type = entity_type
-        self.content = content
+        self.type = sys.intern(entity_type)
         self.full_line = full_line
-        self.references = self._parse_references(full_line)
+        # Offset of the parameter list inside full_line (len(full_line) if there is none)
+        self._content_start = content_start
+        self.references, self.reference_spans = self._parse_references(full_line)
+
+    @property
+    def content(self) -> str:
+        """The entity's parameters: the text between the outer parentheses."""
+        end = self.full_line.rfind(')')
+        if end < self._content_start:
+            return ""
+        return self.full_line[self._content_start:end]
+
+    @classmethod
+    def from_line(cls, line: str) -> Optional['StepEntity']:
+        """Build an entity from a single-line entity instance, or None if it does not parse."""
+        match = re.match(r'#(\d+)\s*=\s*([A-Z_0-9]+)\s*\((.*)\)\s*;', line, re.DOTALL)
+        if match:
+            entity_id = int(match.group(1))
+            entity_type = match.group(2)
+            return cls(entity_id, entity_type, line, match.start(3))
 
-    def _parse_references(self, line: str) -> Set[int]:
-        """Extract all entity references (#xxx) from the line."""
-        refs = set()
-        for match in re.finditer(r'#(\d+)', line):
-            refs.add(int(match.group(1)))
+        match = re.match(r'#(\d+)\s*=\s*\((.*)\)\s*;', line, re.DOTALL)
+        if match:
+            entity_id = int(match.group(1))
+            type_match = cls._TYPE_NAME.search(line, match.start(2), match.end(2))
+            entity_type = type_match.group(1) if type_match else "COMPLEX"
+            return cls(entity_id, entity_type, line, match.start(2))
+        return None
+
+    def _parse_references(self, line: str) -> Tuple[Sequence[int], Sequence[int]]:
+        """Extract all entity references (#xxx) from the line in a single pass.
+
+        Returns the referenced IDs (unique, in file order, without the entity
+        itself) and the flat (start, end) offsets of every occurrence, including
+        the entity's own #id.
+        """
+        refs: Dict[int, None] = {}
+        spans = array('i')
+        pieces = line.split('#')
+        pos = len(pieces[0])
+        for piece in pieces[1:]:
+            digits = len(piece) - len(piece.lstrip(self._DIGITS))
+            if digits:
+                refs[int(piece[:digits])] = None
+                spans.append(pos)
+                spans.append(pos + 1 + digits)
+            pos += 1 + len(piece)
         # Remove self-reference
-        refs.discard(self.id)
-        return refs
+        refs.pop(self.id, None)
+        return (array('q', refs) if refs else ()), (spans if spans else ())
 
     def __repr__(self):
         return f"StepEntity(#{self.id}, {self.type})"
 
 
+class StepTokenizer:
+    """Streaming tokenizer for STEP (ISO 10303-21) files.
+
+    Reads the input in fixed-size chunks and yields one complete statement
+    (everything up to and including its terminating ';') at a time. Semicolons
+    and parentheses inside quoted strings are kept as text, and comments
+    (/* ... */) are dropped, so peak memory is bounded by the largest
+    statement rather than the file size.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    # Characters that change the tokenizer state outside strings and comments
+    _SPECIAL = re.compile(r"[';]|/\*")
+    _SPECIAL_BYTES = re.compile(rb"[';]|/\*")
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def statements(self, stream: TextIO) -> Iterator[str]:
+        """Yield the statements of a STEP stream, stripped of surrounding whitespace."""
+        pieces: List[str] = []
+        in_string = False
+        in_comment = False
+        carry = ""
+
+        while True:
+            chunk = stream.read(self.chunk_size)
+            at_eof = not chunk
+            buf = carry + chunk
+            carry = ""
+
+            # A trailing '/' or '*' may be the first half of a comment
+            # delimiter split across two chunks; it is carried over unconsumed
+            pos = 0
+            end = len(buf)
+            while pos < end:
+                if in_comment:
+                    close = buf.find('*/', pos)
+                    if close < 0:
+                        if not at_eof and buf.endswith('*'):
+                            carry = '*'
+                        pos = end
+                    else:
+                        pos = close + 2
+                        in_comment = False
+                elif in_string:
+                    close = buf.find("'", pos)
+                    if close < 0:
+                        pieces.append(buf[pos:])
+                        pos = end
+                    else:
+                        # A doubled quote ('') simply closes and reopens the string
+                        pieces.append(buf[pos:close + 1])
+                        pos = close + 1
+                        in_string = False
+                else:
+                    match = self._SPECIAL.search(buf, pos)
+                    if match is None:
+                        if not at_eof and buf.endswith('/'):
+                            pieces.append(buf[pos:-1])
+                            carry = '/'
+                        else:
+                            pieces.append(buf[pos:])
+                        pos = end
+                        continue
+                    token = match.group()
+                    start = match.start()
+                    if token == "'":
+                        pieces.append(buf[pos:start + 1])
+                        in_string = True
+                        pos = start + 1
+                    elif token == ';':
+                        pieces.append(buf[pos:start + 1])
+                        statement = ''.join(pieces).strip()
+                        pieces = []
+                        pos = start + 1
+                        if statement:
+                            yield statement
+                    else:
+                        pieces.append(buf[pos:start])
+                        in_comment = True
+                        pos = start + 2
+
+            if at_eof:
+                break
+
+        tail = ''.join(pieces).strip()
+        if tail:
+            yield tail
+
+    def statement_spans(self, data) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) byte offsets of the statements in a bytes-like buffer.
+
+        Works directly on a memory-mapped file. Spans may start with whitespace
+        or comments; end is just past the terminating ';'.
+        """
+        special = self._SPECIAL_BYTES
+        start = pos = 0
+        end = len(data)
+        while pos < end:
+            match = special.search(data, pos)
+            if match is None:
+                break
+            token = match.group()
+            if token == b"'":
+                close = data.find(b"'", match.end())
+                if close < 0:
+                    break
+                pos = close + 1
+            elif token == b';':
+                pos = match.end()
+                yield start, pos
+                start = pos
+            else:
+                close = data.find(b'*/', match.end())
+                if close < 0:
+                    break
+                pos = close + 2
+        if data[start:end].strip():
+            yield start, end
+
+
+class MappedEntityStore(Mapping):
+    """Read-only, memory-mapped entity table with lazy entity materialization.
+
+    Only (id, type, byte offset, length) of every entity is kept, in compact
+    arrays, together with a compact referrer index. An entity's text and
+    references are decoded into a StepEntity only when it is looked up, and
+    a bounded number of decoded entities is cached.
+    """
+
+    CACHE_SIZE = 50000
+
+    # Entity instance header: id, then either TYPE( or a complex entity's first type
+    _ENTITY_HEAD = re.compile(
+        rb'(?:\s+|/\*.*?\*/)*#(\d+)\s*=\s*(?:([A-Z_0-9]+)\s*\(|\([^A-Z_0-9]*([A-Z_0-9]+)?)', re.DOTALL)
+    _KEYWORD = re.compile(rb'(?:\s+|/\*.*?\*/)*([A-Z][A-Z0-9_\-]*)', re.DOTALL)
+    _REFERENCE = re.compile(rb'#(\d+)')
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._file.close()
+            raise ValueError("Invalid STEP file: DATA section not found")
+
+        self.header = ""
+        self.ids = array('q')
+        self.offsets = array('q')
+        self.lengths = array('i')
+        self.type_codes = array('i')
+        self.type_names: List[str] = []
+        self.type_index: Dict[str, array] = {}
+        self._sorted_ids = self.ids
+        self._order: Optional[array] = None
+        self._referrer_starts = array('q')
+        self._referrer_ids = array('q')
+        self._cache: Dict[int, StepEntity] = OrderedDict()
+        self._scan()
+
+    def _scan(self) -> None:
+        """Index every entity of the DATA section in a single pass over the mapped file."""
+        data = self._data
+        type_codes: Dict[str, int] = {}
+        edge_sources = array('q')
+        edge_targets = array('q')
+        header_statements = []
+        section = None
+        found_data = False
+        ascending = True
+        last_id = -1
+
+        for start, end in StepTokenizer().statement_spans(data):
+            head = self._ENTITY_HEAD.match(data, start, end)
+            if head is None:
+                keyword_match = self._KEYWORD.match(data, start, end)
+                keyword = keyword_match.group(1).decode('ascii') if keyword_match else ""
+                if keyword == "HEADER":
+                    section = "HEADER"
+                elif keyword == "DATA":
+                    section = "DATA"
+                    found_data = True
+                elif keyword == "ENDSEC":
+                    section = None
+                elif keyword == "END-ISO-10303-21":
+                    break
+                elif section == "HEADER":
+                    header_statements.append(self._decode(start, end))
+                continue
+            if section != "DATA":
+                continue
+
+            entity_id = int(head.group(1))
+            raw_type = head.group(2) or head.group(3)
+            entity_type = raw_type.decode('ascii') if raw_type else "COMPLEX"
+            code = type_codes.get(entity_type)
+            if code is None:
+                code = type_codes[entity_type] = len(self.type_names)
+                self.type_names.append(entity_type)
+                self.type_index[entity_type] = array('q')
+
+            index = len(self.ids)
+            offset = head.start(1) - 1
+            self.ids.append(entity_id)
+            self.offsets.append(offset)
+            self.lengths.append(end - offset)
+            self.type_codes.append(code)
+            self.type_index[entity_type].append(entity_id)
+            if entity_id <= last_id:
+                ascending = False
+            last_id = entity_id
+
+            refs = {int(m.group(1)) for m in self._REFERENCE.finditer(data, head.end(1), end)}
+            refs.discard(entity_id)
+            for ref in refs:
+                edge_sources.append(index)
+                edge_targets.append(ref)
+
+        if not found_data:
+            raise ValueError("Invalid STEP file: DATA section not found")
+
+        self.header = '\n'.join(header_statements)
+
+        if not ascending:
+            order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+            self._order = array('q', order)
+            self._sorted_ids = array('q', (self.ids[i] for i in order))
+
+        self._build_referrers(edge_sources, edge_targets)
+
+    def _build_referrers(self, edge_sources: array, edge_targets: array) -> None:
+        """Group (source, target) reference edges by target into CSR arrays (counting sort)."""
+        count = len(self.ids)
+        starts = array('q', bytes(8 * (count + 1)))
+        target_indexes = array('q')
+        for target in edge_targets:
+            index = self._index_of(target)
+            target_indexes.append(index)
+            if index >= 0:
+                starts[index + 1] += 1
+        for i in range(count):
+            starts[i + 1] += starts[i]
+
+        fill = array('q', starts)
+        referrer_ids = array('q', bytes(8 * starts[count]))
+        for source, index in zip(edge_sources, target_indexes):
+            if index >= 0:
+                referrer_ids[fill[index]] = self.ids[source]
+                fill[index] += 1
+
+        self._referrer_starts = starts
+        self._referrer_ids = referrer_ids
+
+    def _index_of(self, entity_id: int) -> int:
+        """Return the file-order index of an entity ID, or -1 if it does not exist."""
+        pos = bisect_left(self._sorted_ids, entity_id)
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == entity_id:
+            return self._order[pos] if self._order is not None else pos
+        return -1
+
+    def _decode(self, start: int, end: int) -> str:
+        """Decode a byte range of the file into a single-line statement."""
+        text = self._data[start:end].decode('utf-8', errors='replace')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if '/*' in text:
+            text = ' '.join(StepTokenizer().statements(io.StringIO(text)))
+        return StepParser._join_lines(text.strip())
+
+    def _materialize(self, index: int) -> StepEntity:
+        """Decode the entity at a file-order index."""
+        offset = self.offsets[index]
+        line = self._decode(offset, offset + self.lengths[index])
+        entity = StepEntity.from_line(line)
+        if entity is None:
+            entity = StepEntity(self.ids[index], self.type_names[self.type_codes[index]], line, len(line))
+        return entity
+
+    def entity_type(self, entity_id: int) -> Optional[str]:
+        """Return an entity's type without decoding it."""
+        index = self._index_of(entity_id)
+        return self.type_names[self.type_codes[index]] if index >= 0 else None
+
+    def referrers_of(self, entity_id: int) -> array:
+        """Return the IDs of entities referencing the given entity, in file order."""
+        index = self._index_of(entity_id)
+        if index < 0:
+            return self._referrer_ids[0:0]
+        return self._referrer_ids[self._referrer_starts[index]:self._referrer_starts[index + 1]]
+
+    def close(self) -> None:
+        """Release the memory map and the underlying file."""
+        self._cache.clear()
+        self._data.close()
+        self._file.close()
+
+    def __getitem__(self, entity_id: int) -> StepEntity:
+        cache = self._cache
+        entity = cache.get(entity_id)
+        if entity is not None:
+            cache.move_to_end(entity_id)
+            return entity
+        index = self._index_of(entity_id)
+        if index < 0:
+            raise KeyError(entity_id)
+        entity = self._materialize(index)
+        cache[entity_id] = entity
+        if len(cache) > self.CACHE_SIZE:
+            cache.popitem(last=False)
+        return entity
+
+    def __contains__(self, entity_id) -> bool:
+        return self._index_of(entity_id) >= 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class MappedReferrerIndex(Mapping):
+    """Read-only view of a MappedEntityStore's referrer index as entity ID -> referrer IDs."""
+
+    def __init__(self, store: MappedEntityStore):
+        self._store = store
+
+    def __getitem__(self, entity_id: int) -> array:
+        referrers = self._store.referrers_of(entity_id)
+        if not referrers:
+            raise KeyError(entity_id)
+        return referrers
+
+    def __iter__(self) -> Iterator[int]:
+        return (eid for eid in self._store.ids if self._store.referrers_of(eid))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ClosureEngine:
+    """Memoized transitive-closure (downward dependency) queries on a StepParser.
+
+    Closures are cached in an LRU bounded by the total number of IDs stored.
+    Besides the roots that were asked for, the closures of "hub" entities --
+    entities referenced from many places, such as geometric contexts, units,
+    colours and styles -- are computed once and cached, so walks from different
+    roots reuse them instead of re-walking the shared subgraph.
+    """
+
+    # Entities referenced by at least this many others are treated as hubs
+    HUB_DEGREE = 4
+    # Budget for the total number of IDs held in cached closures
+    MAX_CACHED_IDS = 4000000
+    # Maximum nesting of hub closures computed while walking another closure
+    MAX_NESTING = 32
+
+    def __init__(self, parser: 'StepParser'):
+        self.parser = parser
+        self._cache: Dict[int, FrozenSet[int]] = OrderedDict()
+        self._cached_ids = 0
+        self._in_progress: Set[int] = set()
+
+    def clear(self) -> None:
+        """Drop all cached closures (after the entity table changed)."""
+        self._cache.clear()
+        self._cached_ids = 0
+
+    def closure(self, entity_id: int) -> FrozenSet[int]:
+        """Return the entity and everything it references, directly or indirectly."""
+        cached = self._lookup(entity_id)
+        if cached is not None:
+            return cached
+        self._in_progress.add(entity_id)
+        try:
+            result = frozenset(self._walk((entity_id,), set()))
+        finally:
+            self._in_progress.discard(entity_id)
+        self._store(entity_id, result)
+        return result
+
+    def closure_of_many(self, entity_ids: Iterable[int]) -> Set[int]:
+        """Return the union of the closures of several roots.
+
+        Subgraphs shared between the roots are walked only once.
+        """
+        result: Set[int] = set()
+        roots = []
+        for entity_id in entity_ids:
+            cached = self._lookup(entity_id)
+            if cached is not None:
+                result |= cached
+            else:
+                roots.append(entity_id)
+        return self._walk(roots, result)
+
+    def _walk(self, roots: Iterable[int], result: Set[int]) -> Set[int]:
+        """Add the closures of the roots to result, reusing cached hub closures."""
+        entities = self.parser.entities
+        to_visit = []
+        for root in roots:
+            if root in result:
+                continue
+            result.add(root)
+            entity = entities.get(root)
+            if entity:
+                to_visit.extend(entity.references)
+
+        while to_visit:
+            current = to_visit.pop()
+            if current in result or current not in entities:
+                continue
+
+            cached = self._lookup(current)
+            if cached is None and self._is_hub(current):
+                cached = self._nested_closure(current)
+            if cached is not None:
+                result |= cached
+                continue
+
+            result.add(current)
+            for ref in entities[current].references:
+                if ref not in result:
+                    to_visit.append(ref)
+
+        return result
+
+    def _is_hub(self, entity_id: int) -> bool:
+        return len(self.parser.referrers.get(entity_id, ())) >= self.HUB_DEGREE
+
+    def _nested_closure(self, entity_id: int) -> Optional[FrozenSet[int]]:
+        """Compute and cache a hub's closure while another walk is in progress.
+
+        Returns None (walk through the hub normally) when the hub is already being
+        computed further up, which happens on reference cycles, or when nesting is
+        too deep.
+        """
+        if entity_id in self._in_progress or len(self._in_progress) >= self.MAX_NESTING:
+            return None
+        if not self.parser.entities[entity_id].references:
+            return None
+        return self.closure(entity_id)
+
+    def _lookup(self, entity_id: int) -> Optional[FrozenSet[int]]:
+        cached = self._cache.get(entity_id)
+        if cached is not None:
+            self._cache.move_to_end(entity_id)
+        return cached
+
+    def _store(self, entity_id: int, closure: FrozenSet[int]) -> None:
+        if len(closure) > self.MAX_CACHED_IDS // 4:
+            return
+        self._cache[entity_id] = closure
+        self._cached_ids += len(closure)
+        while self._cached_ids > self.MAX_CACHED_IDS:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_ids -= len(evicted)
+
+
+class ParseCache:
+    """On-disk cache of parsed entity tables, keyed by the input's content hash.
+
+    A snapshot is stored per distinct file content (SHA-256). An index maps
+    each input path to its last seen size, mtime and content hash, so an
+    unchanged file is not even re-hashed; a changed size or mtime triggers a
+    re-hash, and a changed content hash a re-parse. Snapshots from another
+    format version are ignored. The directory is kept under max_bytes by
+    evicting the least recently used snapshots.
+    """
+
+    VERSION = 1
+    MAX_BYTES = 2 << 30
+    HASH_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = MAX_BYTES):
+        if directory is None:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+            directory = os.path.join(base, "step_splitter")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(directory, "index.json")
+
+    def load(self, filepath: str) -> Optional[dict]:
+        """Return the cached snapshot of a file, or None if there is no valid one."""
+        path = self._snapshot_path(self._content_key(filepath))
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            self._remove(path)
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != self.VERSION:
+            self._remove(path)
+            return None
+        # Mark as recently used for LRU eviction
+        os.utime(path)
+        return snapshot
+
+    def store(self, filepath: str, snapshot: dict) -> None:
+        """Save the snapshot of a file, then evict old snapshots over the size cap."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(self._content_key(filepath))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(dict(snapshot, version=self.VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self._evict(keep=path)
+
+    def _snapshot_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def _content_key(self, filepath: str) -> str:
+        """Return the content hash of a file, re-hashing only if its size or mtime changed."""
+        st = os.stat(filepath)
+        abspath = os.path.abspath(filepath)
+        index = self._read_index()
+        entry = index.get(abspath)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        key = f"{digest.hexdigest()}-{st.st_size}"
+
+        index[abspath] = [st.st_size, st.st_mtime_ns, key]
+        self._write_index(index)
+        return key
+
+    def _read_index(self) -> Dict[str, list]:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _write_index(self, index: Dict[str, list]) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self._index_path)
+        except OSError:
+            # The index only saves re-hashing; the cache still works without it
+            pass
+
+    def _evict(self, keep: str) -> None:
+        """Delete least recently used snapshots until the directory fits in max_bytes."""
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshots.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in snapshots)
+        removed = set()
+        for _, size, path in sorted(snapshots):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                removed.add(os.path.basename(path)[:-len(".pickle")])
+                total -= size
+        if removed:
+            index = self._read_index()
+            self._write_index({k: v for k, v in index.items() if v[2] not in removed})
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class PartStore:
+    """Content-addressed store of exported part files, shared between runs and inputs.
+
+    A part is stored as <key[:2]>/<key>.stp (or .stpZ), where the key is derived
+    from its geometry hash, the hash mode and the part name. Parts found in the
+    store are hard-linked into the output directory (copied if the store is on
+    another file system) instead of being collected and written again; newly
+    written parts are linked into the store. Colours and other non-geometric data
+    are taken as they were when the part was first stored. The store is never
+    pruned; entries (or the whole directory) can be deleted at any time.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @classmethod
+    def key(cls, hash_mode: str, geometry_hash: str, part_name: str) -> str:
+        return hashlib.sha256(f"{cls.VERSION}\0{hash_mode}\0{geometry_hash}\0{part_name}".encode()).hexdigest()
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Link the stored part into output_path; False if it is not in the store."""
+        try:
+            self._link(self.path(key, os.path.splitext(output_path)[1]), output_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def add(self, key: str, output_path: str) -> None:
+        """Put a written part file into the store, unless the key is already stored."""
+        path = self.path(key, os.path.splitext(output_path)[1])
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._link(output_path, path)
+
+    @staticmethod
+    def _link(source: str, destination: str) -> None:
+        """Hard-link (or copy) source to destination, replacing it atomically."""
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            # Already linked; renaming a link over another link of the same file does nothing
+            return
+        tmp_path = f"{destination}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(source, tmp_path)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            ParseCache._remove(tmp_path)
+            raise
+
+
 class StepParser:
     """Parser for STEP (ISO 10303-21) files."""
 
-    def __init__(self):
+    def __init__(self, lazy: bool = False, cache: Optional[ParseCache] = None):
+        # Lazy mode memory-maps the file and decodes entities on demand (read-only)
+        self.lazy = lazy
+        # Optional on-disk cache of parse results (not used in lazy mode)
+        self.cache = cache
         self.header = ""
         self.entities: Dict[int, StepEntity] = OrderedDict()
+        # Type index: entity type -> entity IDs in file order
+        self.type_index: Dict[str, List[int]] = {}
+        # Referrer (inverse) index: entity ID -> IDs of entities referencing it, in file order
+        self.referrers: Dict[int, List[int]] = {}
+        # Memoized transitive closures (downward dependencies)
+        self.closures = ClosureEngine(self)
         self.original_filename = ""
 
     def parse(self, filepath: str) -> None:
         """Parse a STEP file and extract all entities."""
         self.original_filename = os.path.splitext(os.path.basename(filepath))[0]
 
-        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
+        if self.lazy:
+            store = MappedEntityStore(filepath)
+            self.header = store.header
+            self.entities = store
+            self.type_index = store.type_index
+            self.referrers = MappedReferrerIndex(store)
+            self.closures.clear()
+            return
 
-        # Extract header
-        header_match = re.search(r'HEADER;(.*?)ENDSEC;', content, re.DOTALL)
-        if header_match:
-            self.header = header_match.group(1)
+        if self.cache is not None:
+            snapshot = self.cache.load(filepath)
+            if snapshot is not None:
+                self._restore(snapshot)
+                return
 
-        # Extract DATA section
-        data_match = re.search(r'DATA;(.*?)ENDSEC;', content, re.DOTALL)
-        if not data_match:
-            raise ValueError("Invalid STEP file: DATA section not found")
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+            self.parse_stream(f)
+
+        if self.cache is not None:
+            self.cache.store(filepath, self._snapshot())
+
+    def _snapshot(self) -> dict:
+        """Pack the entity table and indexes into flat columns for ParseCache."""
+        entities = list(self.entities.values())
+        references = array('q')
+        reference_ends = array('q')
+        spans = array('i')
+        span_ends = array('q')
+        for entity in entities:
+            references.extend(entity.references)
+            reference_ends.append(len(references))
+            spans.extend(entity.reference_spans)
+            span_ends.append(len(spans))
+        referrer_ids = array('q')
+        referrer_ends = array('q')
+        for ids in self.referrers.values():
+            referrer_ids.extend(ids)
+            referrer_ends.append(len(referrer_ids))
+        return {
+            "header": self.header,
+            "ids": array('q', (entity.id for entity in entities)),
+            "types": [entity.type for entity in entities],
+            "lines": [entity.full_line for entity in entities],
+            "content_starts": array('q', (entity._content_start for entity in entities)),
+            "references": references,
+            "reference_ends": reference_ends,
+            "spans": spans,
+            "span_ends": span_ends,
+            "type_index": {entity_type: array('q', ids) for entity_type, ids in self.type_index.items()},
+            "referrer_keys": array('q', self.referrers),
+            "referrer_ids": referrer_ids,
+            "referrer_ends": referrer_ends,
+        }
 
-        data_section = data_match.group(1)
-        self._parse_entities(data_section)
+    def _restore(self, snapshot: dict) -> None:
+        """Rebuild the entity table and indexes from a ParseCache snapshot (no tokenizing)."""
+        self.header = snapshot["header"]
+        self.closures.clear()
+
+        entities = OrderedDict()
+        new_entity = object.__new__
+        intern = sys.intern
+        references, reference_ends = snapshot["references"], snapshot["reference_ends"]
+        spans, span_ends = snapshot["spans"], snapshot["span_ends"]
+        reference_start = span_start = 0
+        for entity_id, entity_type, line, content_start, reference_end, span_end in zip(
+                snapshot["ids"], snapshot["types"], snapshot["lines"], snapshot["content_starts"],
+                reference_ends, span_ends):
+            entity = new_entity(StepEntity)
+            entity.id = entity_id
+            entity.type = intern(entity_type)
+            entity.full_line = line
+            entity._content_start = content_start
+            entity.references = references[reference_start:reference_end] if reference_end > reference_start else ()
+            entity.reference_spans = spans[span_start:span_end] if span_end > span_start else ()
+            reference_start, span_start = reference_end, span_end
+            entities[entity_id] = entity
+        self.entities = entities
+
+        self.type_index = {entity_type: ids.tolist() for entity_type, ids in snapshot["type_index"].items()}
+        referrers = {}
+        referrer_ids = snapshot["referrer_ids"]
+        start = 0
+        for key, end in zip(snapshot["referrer_keys"], snapshot["referrer_ends"]):
+            referrers[key] = referrer_ids[start:end].tolist()
+            start = end
+        self.referrers = referrers
+
+    def parse_stream(self, stream: TextIO) -> None:
+        """Parse STEP data from an open text stream.
+
+        The stream is tokenized chunk by chunk, so only the statement being
+        parsed is held in memory besides the entities themselves.
+        """
+        self.header = ""
+        self.entities = OrderedDict()
+        self.type_index = {}
+        self.referrers = {}
+        self.closures.clear()
+
+        header_statements = []
+        section = None
+        found_data = False
+
+        for statement in StepTokenizer().statements(stream):
+            if statement.startswith('#'):
+                if section == "DATA":
+                    self._parse_entity_line(self._join_lines(statement))
+                continue
 
-    def _parse_entities(self, data_section: str) -> None:
-        """Parse all entities from the DATA section."""
-        current_entity = []
-        paren_depth = 0
-        in_entity = False
+            keyword = statement.rstrip(';').split('(', 1)[0].strip()
+            if keyword == "HEADER":
+                section = "HEADER"
+            elif keyword == "DATA":
+                section = "DATA"
+                found_data = True
+            elif keyword == "ENDSEC":
+                section = None
+            elif keyword == "END-ISO-10303-21":
+                break
+            elif section == "HEADER":
+                header_statements.append(statement)
 
-        for line in data_section.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
+        if not found_data:
+            raise ValueError("Invalid STEP file: DATA section not found")
+
+        self.header = '\n'.join(header_statements)
 
-            if not in_entity and line.startswith('#'):
-                in_entity = True
-                current_entity = [line]
-                paren_depth = line.count('(') - line.count(')')
-            elif in_entity:
-                current_entity.append(line)
-                paren_depth += line.count('(') - line.count(')')
-
-            if in_entity and paren_depth <= 0 and ';' in line:
-                entity_str = ' '.join(current_entity)
-                self._parse_entity_line(entity_str)
-                in_entity = False
-                current_entity = []
-                paren_depth = 0
+    @staticmethod
+    def _join_lines(statement: str) -> str:
+        """Join a statement spanning several lines into a single line."""
+        if '\n' not in statement:
+            return statement
+        return ' '.join(line.strip() for line in statement.split('\n') if line.strip())
 
     def _parse_entity_line(self, line: str) -> None:
         """Parse a single entity line."""
-        match = re.match(r'#(\d+)\s*=\s*([A-Z_0-9]+)\s*\((.*)\)\s*;', line, re.DOTALL)
-        if match:
-            entity_id = int(match.group(1))
-            entity_type = match.group(2)
-            content = match.group(3)
-            self.entities[entity_id] = StepEntity(entity_id, entity_type, content, line)
-        else:
-            match = re.match(r'#(\d+)\s*=\s*\((.*)\)\s*;', line, re.DOTALL)
-            if match:
-                entity_id = int(match.group(1))
-                content = match.group(2)
-                type_match = re.search(r'([A-Z_0-9]+)', content)
-                entity_type = type_match.group(1) if type_match else "COMPLEX"
-                self.entities[entity_id] = StepEntity(entity_id, entity_type, content, line)
+        entity = StepEntity.from_line(line)
+        if entity:
+            self.add_entity(entity)
+
+    def add_entity(self, entity: StepEntity) -> None:
+        """Add an entity (or replace one with the same ID) and keep the indexes in sync."""
+        if isinstance(self.entities, MappedEntityStore):
+            raise ValueError("Cannot add entities to a lazily parsed (memory-mapped) file")
+        previous = self.entities.get(entity.id)
+        if previous is not None:
+            ids = self.type_index.get(previous.type, [])
+            if entity.id in ids:
+                ids.remove(entity.id)
+            for ref in previous.references:
+                referrers = self.referrers.get(ref, [])
+                if entity.id in referrers:
+                    referrers.remove(entity.id)
+        self.entities[entity.id] = entity
+        self.type_index.setdefault(entity.type, []).append(entity.id)
+        if previous is not None or entity.id in self.referrers:
+            # Cached closures may now be stale
+            self.closures.clear()
+        for ref in entity.references:
+            self.referrers.setdefault(ref, []).append(entity.id)
 
     def find_entities_by_type(self, entity_type: str) -> List[int]:
         """Find all entity IDs of a specific type."""
-        return [eid for eid, entity in self.entities.items() if entity.type == entity_type]
+        return list(self.type_index.get(entity_type, ()))
 
-    def get_transitive_dependencies(self, entity_id: int) -> Set[int]:
-        """Get all entities that are directly or indirectly referenced by the given entity."""
-        visited = set()
-        to_visit = [entity_id]
+    def get_transitive_dependencies(self, entity_id: int) -> AbstractSet[int]:
+        """Get all entities that are directly or indirectly referenced by the given entity.
 
-        while to_visit:
-            current = to_visit.pop()
-            if current in visited:
-                continue
-            visited.add(current)
-
-            entity = self.entities.get(current)
-            if entity:
-                for ref in entity.references:
-                    if ref not in visited and ref in self.entities:
-                        to_visit.append(ref)
+        The result is cached and shared between callers, so it must not be modified.
+        """
+        return self.closures.closure(entity_id)
 
-        return visited
+    def get_transitive_dependencies_many(self, entity_ids: Iterable[int]) -> Set[int]:
+        """Get the union of the transitive dependencies of several entities in one walk."""
+        return self.closures.closure_of_many(entity_ids)
 
     def get_referencing_entities(self, entity_id: int) -> Set[int]:
         """Get all entities that reference the given entity."""
-        return {eid for eid, entity in self.entities.items() if entity_id in entity.references}
+        return set(self.referrers.get(entity_id, ()))
+
+    def get_referrers(self, entity_id: int, entity_type: Optional[str] = None) -> List[int]:
+        """Get IDs of entities referencing the given entity, in file order.
+
+        If entity_type is given, only referrers of that type are returned.
+        """
+        referrers = self.referrers.get(entity_id, ())
+        if entity_type is None:
+            return list(referrers)
+        return [eid for eid in referrers if self.get_entity_type(eid) == entity_type]
+
+    def get_entity_type(self, entity_id: int) -> Optional[str]:
+        """Get the type of an entity without decoding it in lazy mode."""
+        if isinstance(self.entities, MappedEntityStore):
+            return self.entities.entity_type(entity_id)
+        entity = self.entities.get(entity_id)
+        return entity.type if entity else None
 
 
 class StepWriter:
-    """Writer for generating STEP files from selected entities."""
+    """Writer for generating STEP files from selected entities.
+
+    Entities are renumbered and written one line at a time to a buffered
+    stream, so memory use does not grow with the size of the part.
+    """
 
     FILE_SCHEMA = "'AP203_CONFIGURATION_CONTROLLED_3D_DESIGN_OF_MECHANICAL_PARTS_AND_ASSEMBLIES_MIM_LF { 1 0 10303 403 2 1 2 }'"
 
+    BUFFER_SIZE = 1 << 20
+
     def write_step_file(self, output_path: str, part_name: str,
                         entity_ids: Set[int], parser: StepParser,
                         solid_id: int = None, context_id: int = None) -> None:
         """Write a STEP file with the selected entities.
 
+        output_path is a file path, or "-" for standard output. See write_step_stream
+        for the remaining arguments.
+        """
+        if output_path == "-":
+            self.write_step_stream(sys.stdout, part_name, entity_ids, parser, solid_id, context_id)
+            sys.stdout.flush()
+            return
+        with open(output_path, 'w', encoding='utf-8', buffering=self.BUFFER_SIZE) as f:
+            self.write_step_stream(f, part_name, entity_ids, parser, solid_id, context_id)
+
+    def write_step_stream(self, stream: TextIO, part_name: str,
+                          entity_ids: Set[int], parser: StepParser,
+                          solid_id: int = None, context_id: int = None) -> None:
+        """Write a STEP file with the selected entities to a text stream (file, pipe, socket file).
+
+        Entities are renumbered and written one at a time, so memory use does not
+        grow with the part. The splitter writes parts through PartOutput.open().
+
         If solid_id and context_id are provided, a synthetic ADVANCED_BREP_SHAPE_REPRESENTATION
         will be created that references only this solid (for files where all solids share
         one ABREP).
         """
-        sorted_ids = sorted(entity_ids)
-        id_mapping = {old_id: new_id for new_id, old_id in enumerate(sorted_ids, start=1)}
+        write = stream.write
+        write("ISO-10303-21;\n")
+        write("HEADER;\n")
+        write("FILE_DESCRIPTION((''),'2;1');\n")
 
-        # Reserve an ID for synthetic ABREP if needed
-        synthetic_abrep_id = None
-        if solid_id is not None and context_id is not None:
-            synthetic_abrep_id = len(sorted_ids) + 1
+        timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        write(f"FILE_NAME('{part_name.upper()}','{timestamp}',(''),(''),'STEP SPLITTER','STEP SPLITTER','');\n")
 
-        lines = []
-        lines.append("ISO-10303-21;")
-        lines.append("HEADER;")
-        lines.append("FILE_DESCRIPTION((''),'2;1');")
+        write("FILE_SCHEMA((\n")
+        write(self.FILE_SCHEMA + "));\n")
+        write("ENDSEC;\n")
+        write("DATA;\n")
 
-        timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-        lines.append(f"FILE_NAME('{part_name.upper()}','{timestamp}',(''),(''),'STEP SPLITTER','STEP SPLITTER','');")
+        for line in self.entity_lines(entity_ids, parser, solid_id, context_id):
+            write(line)
+            write("\n")
 
-        lines.append("FILE_SCHEMA((")
-        lines.append(self.FILE_SCHEMA + "));")
-        lines.append("ENDSEC;")
-        lines.append("DATA;")
+        write("ENDSEC;\n")
+        write("END-ISO-10303-21;")
+
+    def entity_lines(self, entity_ids: Set[int], parser: StepParser,
+                     solid_id: int = None, context_id: int = None) -> Iterator[str]:
+        """Yield the renumbered DATA section lines for the selected entities."""
+        sorted_ids = sorted(entity_ids)
+        # Old ID digits -> new "#id" reference text, ready to be spliced into lines
+        ref_mapping = {str(old_id): f"#{new_id}" for new_id, old_id in enumerate(sorted_ids, start=1)}
 
         for old_id in sorted_ids:
             entity = parser.entities.get(old_id)
             if entity:
-                line = self._renumber_references(entity.full_line, id_mapping)
-                lines.append(line)
+                yield self._renumber_references(entity, ref_mapping)
 
         # Add synthetic ADVANCED_BREP_SHAPE_REPRESENTATION if needed
-        if synthetic_abrep_id is not None:
-            new_solid_id = id_mapping.get(solid_id, 1)
-            new_context_id = id_mapping.get(context_id, 2)
-            lines.append(f"#{synthetic_abrep_id}=ADVANCED_BREP_SHAPE_REPRESENTATION('',(#{new_solid_id}),#{new_context_id});")
-
-        lines.append("ENDSEC;")
-        lines.append("END-ISO-10303-21;")
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lines))
+        if solid_id is not None and context_id is not None:
+            synthetic_abrep_id = len(sorted_ids) + 1
+            new_solid_ref = ref_mapping.get(str(solid_id), "#1")
+            new_context_ref = ref_mapping.get(str(context_id), "#2")
+            yield f"#{synthetic_abrep_id}=ADVANCED_BREP_SHAPE_REPRESENTATION('',({new_solid_ref}),{new_context_ref});"
 
-    def _renumber_references(self, line: str, id_mapping: Dict[int, int]) -> str:
-        """Renumber all entity references in a line."""
-        def replace_ref(match):
-            old_id = int(match.group(1))
-            new_id = id_mapping.get(old_id)
-            if new_id is not None:
-                return f"#{new_id}"
-            return match.group(0)
+    def content_digest(self, part_name: str, entity_ids: Set[int], parser: StepParser,
+                       solid_id: int = None, context_id: int = None) -> str:
+        """Digest of everything a written part depends on except its timestamp.
 
-        return re.sub(r'#(\d+)', replace_ref, line)
+        Hashes the source lines as they are, without renumbering them: the
+        renumbering only depends on those lines, so equal digests mean equal
+        parts. (The same part with other entity IDs gets another digest.)
+        """
+        digest = hashlib.sha256(part_name.encode('utf-8'))
+        if solid_id is not None and context_id is not None:
+            digest.update(f"\n#{solid_id},#{context_id}".encode('utf-8'))
+        entities = parser.entities
+        for entity_id in sorted(entity_ids):
+            entity = entities.get(entity_id)
+            if entity:
+                digest.update(b'\n')
+                digest.update(entity.full_line.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _renumber_references(self, entity: StepEntity, ref_mapping: Dict[str, str]) -> str:
+        """Renumber all entity references in an entity's line by splicing at the recorded offsets."""
+        line = entity.full_line
+        spans = entity.reference_spans
+        if not spans:
+            return line
+        pieces = []
+        pos = 0
+        offsets = iter(spans)
+        for start in offsets:
+            end = next(offsets)
+            digits = line[start + 1:end]
+            new_ref = ref_mapping.get(digits)
+            if new_ref is None and digits[0] == '0':
+                # Zero-padded reference (#007)
+                new_ref = ref_mapping.get(str(int(digits)))
+            if new_ref is not None:
+                pieces.append(line[pos:start])
+                pieces.append(new_ref)
+                pos = end
+        pieces.append(line[pos:])
+        return ''.join(pieces)
+
+
+class PartOutput:
+    """Destination of the split parts.
+
+    Formats:
+        stp  - one .stp file per part in the output directory
+        stpZ - one gzip-compressed .stpZ file per part
+        zip  - a single <base_name>.zip archive of .stp members
+        tar  - a single <base_name>.tar.gz archive of .stp members
+
+    Parts are compressed as they are written, so nothing is re-read afterwards.
+    """
+
+    FORMATS = ("stp", "stpZ", "zip", "tar")
+    COMPRESS_LEVEL = 6
+
+    # Tar members need their size up front; parts up to this size are staged in memory
+    TAR_SPOOL_SIZE = 16 << 20
+
+    def __init__(self, output_dir: str, base_name: str, output_format: str = "stp",
+                 compress_level: int = COMPRESS_LEVEL):
+        if output_format not in self.FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.compress_level = compress_level
+        self.archive_path = None
+        self._archive = None
+        if output_format == "zip":
+            self.archive_path = os.path.join(output_dir, f"{base_name}.zip")
+            self._archive = zipfile.ZipFile(self.archive_path, 'w', zipfile.ZIP_DEFLATED,
+                                            compresslevel=compress_level)
+        elif output_format == "tar":
+            self.archive_path = os.path.join(output_dir, f"{base_name}.tar.gz")
+            self._archive = tarfile.open(self.archive_path, 'w:gz', compresslevel=compress_level)
+
+    @property
+    def parallel(self) -> bool:
+        """Whether parts can be written from several processes at once (not into one archive)."""
+        return self._archive is None
+
+    def part_path(self, filename: str) -> str:
+        """Return where a part file named filename (*.stp) is written: a path, or an archive member name."""
+        if self._archive is not None:
+            return filename
+        if self.output_format == "stpZ":
+            filename = os.path.splitext(filename)[0] + ".stpZ"
+        return os.path.join(self.output_dir, filename)
+
+    @contextmanager
+    def open(self, path: str) -> Iterator[TextIO]:
+        """Open a part returned by part_path() for writing as a text stream."""
+        if self._archive is None:
+            self._unlink_shared(path)
+        if self.output_format == "stp":
+            with open(path, 'w', encoding='utf-8', buffering=StepWriter.BUFFER_SIZE) as f:
+                yield f
+        elif self.output_format == "stpZ":
+            with gzip.open(path, 'wt', compresslevel=self.compress_level, encoding='utf-8') as f:
+                yield f
+        elif self.output_format == "zip":
+            with self._archive.open(path, 'w', force_zip64=True) as member:
+                with io.TextIOWrapper(member, encoding='utf-8') as f:
+                    yield f
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=self.TAR_SPOOL_SIZE) as spool:
+                f = io.TextIOWrapper(spool, encoding='utf-8')
+                yield f
+                f.flush()
+                f.detach()
+                info = tarfile.TarInfo(path)
+                info.size = spool.tell()
+                info.mtime = int(datetime.now().timestamp())
+                spool.seek(0)
+                self._archive.addfile(info, spool)
+
+    @staticmethod
+    def _unlink_shared(path: str) -> None:
+        """Remove a part file with other hard links (e.g. in a PartStore), so writing it leaves them alone."""
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        """Finish the archive, if any."""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
 
 
 class GeometryHasher:
     """Computes geometry hashes for duplicate detection."""
 
+    # Entity types that make up a solid's geometry (not colors, styles, etc.)
+    GEOMETRIC_TYPES = {
+        'CARTESIAN_POINT', 'DIRECTION', 'VECTOR', 'LINE', 'CIRCLE', 'ELLIPSE',
+        'B_SPLINE_CURVE', 'B_SPLINE_SURFACE', 'PLANE', 'CYLINDRICAL_SURFACE',
+        'CONICAL_SURFACE', 'SPHERICAL_SURFACE', 'TOROIDAL_SURFACE',
+        'AXIS2_PLACEMENT_3D', 'AXIS1_PLACEMENT', 'VERTEX_POINT', 'EDGE_CURVE',
+        'ORIENTED_EDGE', 'EDGE_LOOP', 'FACE_OUTER_BOUND', 'FACE_BOUND',
+        'ADVANCED_FACE', 'CLOSED_SHELL', 'OPEN_SHELL', 'MANIFOLD_SOLID_BREP',
+        'BREP_WITH_VOIDS'
+    }
+
+    _COORDINATES = re.compile(r'\(([^()]*)\)\s*$')
+
+    # Whitespace outside string literals ('' is an escaped quote inside one)
+    _WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+    # Whether compute_signature tells solids apart (if not, the signature stage is skipped)
+    HAS_SIGNATURE = True
+
     def __init__(self, parser: StepParser):
         self.parser = parser
 
+    def compute_signature(self, solid_id: int) -> Tuple:
+        """
+        Compute a cheap signature of a solid: counts of each geometric entity type
+        and the bounding box of its points. Solids with equal geometry hashes always
+        have equal signatures, so solids with a unique signature need no full hash.
+        """
+        deps = self.parser.get_transitive_dependencies(solid_id)
+        type_counts: Dict[str, int] = {}
+        low = [float('inf')] * 3
+        high = [float('-inf')] * 3
+        for eid in deps:
+            entity = self.parser.entities.get(eid)
+            if not entity or entity.type not in self.GEOMETRIC_TYPES:
+                continue
+            type_counts[entity.type] = type_counts.get(entity.type, 0) + 1
+            if entity.type == 'CARTESIAN_POINT':
+                coordinates = self._parse_coordinates(entity.content)
+                if coordinates:
+                    for axis, value in enumerate(coordinates):
+                        # Same rounding as _normalize_entity
+                        value = float(f"{value:.6g}")
+                        low[axis] = min(low[axis], value)
+                        high[axis] = max(high[axis], value)
+        return tuple(sorted(type_counts.items())), tuple(low), tuple(high)
+
+    def _parse_coordinates(self, content: str) -> Optional[Tuple[float, float, float]]:
+        """Parse the 3D coordinate list of a CARTESIAN_POINT or DIRECTION (None if not 3D)."""
+        match = self._COORDINATES.search(content)
+        if not match:
+            return None
+        try:
+            values = tuple(float(v) for v in match.group(1).split(','))
+        except ValueError:
+            return None
+        return values if len(values) == 3 else None
+
     def compute_geometry_hash(self, solid_id: int) -> str:
         """
         Compute a hash of the geometry for duplicate detection.
@@ -226,22 +1279,11 @@ class GeometryHasher:
         # Get all geometric entities for this solid
         deps = self.parser.get_transitive_dependencies(solid_id)
 
-        # Filter to only geometric entities (not colors, styles, etc.)
-        geometric_types = {
-            'CARTESIAN_POINT', 'DIRECTION', 'VECTOR', 'LINE', 'CIRCLE', 'ELLIPSE',
-            'B_SPLINE_CURVE', 'B_SPLINE_SURFACE', 'PLANE', 'CYLINDRICAL_SURFACE',
-            'CONICAL_SURFACE', 'SPHERICAL_SURFACE', 'TOROIDAL_SURFACE',
-            'AXIS2_PLACEMENT_3D', 'AXIS1_PLACEMENT', 'VERTEX_POINT', 'EDGE_CURVE',
-            'ORIENTED_EDGE', 'EDGE_LOOP', 'FACE_OUTER_BOUND', 'FACE_BOUND',
-            'ADVANCED_FACE', 'CLOSED_SHELL', 'OPEN_SHELL', 'MANIFOLD_SOLID_BREP',
-            'BREP_WITH_VOIDS'
-        }
-
         # Collect geometric content (normalized - without entity IDs)
         geo_content = []
         for eid in sorted(deps):
             entity = self.parser.entities.get(eid)
-            if entity and entity.type in geometric_types:
+            if entity and entity.type in self.GEOMETRIC_TYPES:
                 # Normalize: remove entity ID, keep type and numeric values
                 normalized = self._normalize_entity(entity)
                 geo_content.append(normalized)
@@ -255,8 +1297,9 @@ class GeometryHasher:
 
     def _normalize_entity(self, entity: StepEntity) -> str:
         """Normalize an entity for comparison (remove IDs, keep structure)."""
-        # Extract numeric values from the content
-        content = entity.content
+        # Extract numeric values from the content; whitespace between parameters
+        # (e.g. left by joining a statement's lines) is not significant
+        content = self._WHITESPACE.sub(self._keep_string, entity.content)
 
         # Remove all entity references (#xxx) - we only care about the numeric geometry
         normalized = re.sub(r'#\d+', '#REF', content)
@@ -273,6 +1316,611 @@ class GeometryHasher:
 
         return f"{entity.type}({normalized})"
 
+    @staticmethod
+    def _keep_string(match) -> str:
+        return match.group(1) or ''
+
+
+class MerkleGeometryHasher(GeometryHasher):
+    """Structure-aware geometry hashes built bottom-up, Merkle style.
+
+    Each entity is hashed once from its type, its rounded parameters and the
+    hashes of the entities it references (in order). Hashes are cached per
+    entity ID, so hashing every solid of a file is linear in the file size and
+    a solid's hash is the cached hash of its root entity.
+    """
+
+    # Stand-ins for references to missing entities and for reference cycles
+    _MISSING = b'missing'
+    _CYCLE = b'cycle'
+
+    def __init__(self, parser: StepParser):
+        super().__init__(parser)
+        self._entity_hashes: Dict[int, bytes] = {}
+
+    HAS_SIGNATURE = False
+
+    def compute_signature(self, solid_id: int) -> Tuple:
+        """No pre-hash signature: Merkle hashing is already linear in the file size, and
+        solids with equal hashes may share sub-entities differently (different counts)."""
+        return ()
+
+    def compute_geometry_hash(self, solid_id: int) -> str:
+        """Compute the structure-aware hash of a solid's geometry."""
+        return self.entity_hash(solid_id).hex()
+
+    def entity_hash(self, entity_id: int) -> bytes:
+        """Return the hash of an entity and everything below it, computing it if needed."""
+        cached = self._entity_hashes.get(entity_id)
+        if cached is not None:
+            return cached
+
+        entities = self.parser.entities
+        hashes = self._entity_hashes
+        in_progress: Set[int] = set()
+        # Iterative post-order walk: children are hashed before their parents
+        to_visit = [(entity_id, False)]
+        while to_visit:
+            current, expanded = to_visit.pop()
+            if current in hashes:
+                continue
+            entity = entities.get(current)
+            if entity is None:
+                hashes[current] = self._MISSING
+                continue
+
+            if not expanded:
+                if current in in_progress:
+                    continue
+                in_progress.add(current)
+                to_visit.append((current, True))
+                for ref in entity.references:
+                    if ref not in hashes and ref not in in_progress:
+                        to_visit.append((ref, False))
+                continue
+
+            digest = hashlib.md5(self._normalize_entity(entity).encode())
+            for ref in entity.references:
+                digest.update(hashes.get(ref, self._CYCLE))
+            hashes[current] = digest.digest()
+            in_progress.discard(current)
+
+        return hashes.get(entity_id, self._MISSING)
+
+
+class PlacementInvariantHasher(GeometryHasher):
+    """Geometry hashes that ignore where a solid is placed.
+
+    Each solid is moved into a canonical local frame before hashing: the origin
+    is the centroid of its CARTESIAN_POINTs and the axes are their principal
+    axes. CARTESIAN_POINT coordinates and DIRECTIONs are expressed in that frame
+    and quantized relative to the solid's size, so translated or rotated copies
+    of a part hash the same. Mirrored copies do not, because the frame is always
+    right-handed. Parts with symmetric point clouds (equal principal moments,
+    e.g. cubes or cylinders) have no unique frame and may still hash differently.
+    """
+
+    # Coordinates are quantized to this fraction of the solid's radius
+    TOLERANCE = 1e-6
+
+    # Sign flips of the principal axes that keep the frame right-handed; the
+    # smallest hash over all of them is used, so axis signs need not be resolved
+    _AXIS_FLIPS = ((1, 1, 1), (1, -1, -1), (-1, 1, -1), (-1, -1, 1))
+
+    def compute_signature(self, solid_id: int) -> Tuple:
+        """Compute a cheap signature: entity type counts only (the bounding box depends on placement)."""
+        return super().compute_signature(solid_id)[0]
+
+    def compute_geometry_hash(self, solid_id: int) -> str:
+        """Compute a hash of the solid's geometry in its canonical local frame."""
+        deps = self.parser.get_transitive_dependencies(solid_id)
+
+        points: List[Tuple[float, float, float]] = []
+        directions: List[Tuple[float, float, float]] = []
+        other_content = []
+        for eid in sorted(deps):
+            entity = self.parser.entities.get(eid)
+            if not entity or entity.type not in self.GEOMETRIC_TYPES:
+                continue
+            coordinates = None
+            if entity.type in ('CARTESIAN_POINT', 'DIRECTION'):
+                coordinates = self._parse_coordinates(entity.content)
+            if coordinates is None:
+                other_content.append(self._normalize_entity(entity))
+            elif entity.type == 'CARTESIAN_POINT':
+                points.append(coordinates)
+            else:
+                directions.append(coordinates)
+
+        if not points:
+            return super().compute_geometry_hash(solid_id)
+
+        count = len(points)
+        centroid = tuple(sum(p[axis] for p in points) / count for axis in range(3))
+        centered = [(p[0] - centroid[0], p[1] - centroid[1], p[2] - centroid[2]) for p in points]
+        axes = self._principal_axes(centered)
+        radius = max((p[0] * p[0] + p[1] * p[1] + p[2] * p[2]) ** 0.5 for p in centered) or 1.0
+        point_quantum = radius * self.TOLERANCE
+
+        candidates = []
+        for flip in self._AXIS_FLIPS:
+            frame = [tuple(sign * c for c in axis) for sign, axis in zip(flip, axes)]
+            geo_content = list(other_content)
+            for p in centered:
+                geo_content.append("CARTESIAN_POINT(%d,%d,%d)" % self._to_frame(p, frame, point_quantum))
+            for d in directions:
+                geo_content.append("DIRECTION(%d,%d,%d)" % self._to_frame(d, frame, self.TOLERANCE))
+            geo_content.sort()
+            candidates.append(hashlib.md5('\n'.join(geo_content).encode()).hexdigest())
+        return min(candidates)
+
+    @staticmethod
+    def _to_frame(vector: Tuple[float, float, float], frame: List[Tuple[float, float, float]],
+                  quantum: float) -> Tuple[int, int, int]:
+        """Express a vector in the frame's axes, quantized to multiples of quantum."""
+        return tuple(int(round((vector[0] * axis[0] + vector[1] * axis[1] + vector[2] * axis[2]) / quantum))
+                     for axis in frame)
+
+    @staticmethod
+    def _principal_axes(centered: List[Tuple[float, float, float]]) -> List[Tuple[float, float, float]]:
+        """Return the principal axes of a centered point cloud as a right-handed frame.
+
+        Axes are ordered by decreasing spread. Uses Jacobi rotations on the 3x3
+        covariance matrix.
+        """
+        a = [[sum(p[i] * p[j] for p in centered) for j in range(3)] for i in range(3)]
+        v = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+        scale = a[0][0] + a[1][1] + a[2][2]
+
+        for _ in range(50):
+            off_diagonal = a[0][1] ** 2 + a[0][2] ** 2 + a[1][2] ** 2
+            if off_diagonal <= (scale * 1e-15) ** 2:
+                break
+            for p, q in ((0, 1), (0, 2), (1, 2)):
+                if a[p][q] == 0.0:
+                    continue
+                theta = (a[q][q] - a[p][p]) / (2.0 * a[p][q])
+                t = (1.0 if theta >= 0 else -1.0) / (abs(theta) + (theta * theta + 1.0) ** 0.5)
+                c = 1.0 / (t * t + 1.0) ** 0.5
+                s = t * c
+                for k in range(3):
+                    akp, akq = a[k][p], a[k][q]
+                    a[k][p] = c * akp - s * akq
+                    a[k][q] = s * akp + c * akq
+                for k in range(3):
+                    apk, aqk = a[p][k], a[q][k]
+                    a[p][k] = c * apk - s * aqk
+                    a[q][k] = s * apk + c * aqk
+                for k in range(3):
+                    vkp, vkq = v[k][p], v[k][q]
+                    v[k][p] = c * vkp - s * vkq
+                    v[k][q] = s * vkp + c * vkq
+
+        order = sorted(range(3), key=lambda i: -a[i][i])
+        e1 = tuple(v[k][order[0]] for k in range(3))
+        e2 = tuple(v[k][order[1]] for k in range(3))
+        e3 = (e1[1] * e2[2] - e1[2] * e2[1],
+              e1[2] * e2[0] - e1[0] * e2[2],
+              e1[0] * e2[1] - e1[1] * e2[0])
+        return [e1, e2, e3]
+
+
+class SplitProfiler:
+    """Per-phase wall/CPU timings, counters and per-part timings of one split.
+
+    CPU time includes worker processes that have finished during the phase.
+    If cprofile is set, the HOT_PHASES run under cProfile (in this process).
+    """
+
+    HOT_PHASES = ("signature", "geometry_hash", "export")
+
+    def __init__(self, cprofile: bool = False):
+        self.started = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = self._cpu_time()
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.parts: List[dict] = []
+        self.profile = cProfile.Profile() if cprofile else None
+
+    @staticmethod
+    def _cpu_time() -> float:
+        cpu = time.process_time()
+        if resource is not None:
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu += children.ru_utime + children.ru_stime
+        return cpu
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase (repeated phases are summed)."""
+        profile = self.profile if name in self.HOT_PHASES else None
+        wall = time.perf_counter()
+        cpu = self._cpu_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.add_phase(name, time.perf_counter() - wall, self._cpu_time() - cpu)
+
+    def add_phase(self, name: str, wall: float, cpu: Optional[float] = None) -> None:
+        """Add time measured elsewhere (e.g. in a worker process) to a phase."""
+        stats = self.phases.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+        stats["calls"] += 1
+        stats["wall_seconds"] += wall
+        if cpu is None or stats["cpu_seconds"] is None:
+            stats["cpu_seconds"] = None
+        else:
+            stats["cpu_seconds"] += cpu
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    @staticmethod
+    def _peak_rss() -> Dict[str, Optional[int]]:
+        if resource is None:
+            return {"self": None, "children": None}
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+                "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+
+    def to_dict(self) -> dict:
+        def rounded(value):
+            return round(value, 6) if isinstance(value, float) else value
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_seconds": rounded(time.perf_counter() - self._start_wall),
+            "cpu_seconds": rounded(self._cpu_time() - self._start_cpu),
+            "phases": {name: {key: rounded(value) for key, value in stats.items()}
+                       for name, stats in self.phases.items()},
+            "counts": self.counts,
+            "peak_rss_bytes": self._peak_rss(),
+            "parts": [{key: rounded(value) for key, value in part.items()} for part in self.parts],
+        }
+
+    def write(self, json_path: str, profile_path: Optional[str] = None) -> None:
+        """Write the metrics as JSON and, if cProfile was on, the pstats dump."""
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        if self.profile is not None and profile_path:
+            self.profile.dump_stats(profile_path)
+
+
+class PartSelection:
+    """Restricts a split to some parts.
+
+    names:    shell-style patterns (case-insensitive) matched against product,
+              part and volume names
+    pd_ids:   PRODUCT_DEFINITION IDs; an assembly PD selects every part below it
+    subtrees: paths of product name patterns from the root assembly down,
+              separated by '/', e.g. "ROBOT/ARM*"; the root's name may be omitted
+
+    Each kind of filter that is given must match (a part must satisfy the names
+    AND the PD AND the subtree filters); within one kind any entry may match.
+    """
+
+    def __init__(self, names: Iterable[str] = (), pd_ids: Iterable[int] = (), subtrees: Iterable[str] = ()):
+        self.names = [name.lower() for name in names]
+        self.pd_ids = set(pd_ids)
+        self.subtrees = [[step for step in path.split('/') if step] for path in subtrees]
+
+    def __bool__(self) -> bool:
+        return bool(self.names or self.pd_ids or self.subtrees)
+
+    def matches_name(self, *names: Optional[str]) -> bool:
+        """Whether any of the given names matches the name patterns (True without name patterns)."""
+        if not self.names:
+            return True
+        return any(name and fnmatch.fnmatchcase(name.lower(), pattern)
+                   for name in names for pattern in self.names)
+
+
+class PartExport(NamedTuple):
+    """One unique part to extract: its solid, name, output file and progress message.
+
+    digest, written, the store fields and the timings are filled in by the export
+    (see StepSplitter._export_part).
+    """
+    solid_id: int
+    part_name: str
+    output_path: str
+    message: str
+    geometry_hash: Optional[str] = None
+    digest: Optional[str] = None
+    written: bool = True
+    collect_seconds: float = 0.0
+    write_seconds: float = 0.0
+    size: int = 0
+    store_key: Optional[str] = None
+    from_store: bool = False
+
+
+class ProductStructureIndex:
+    """Links between solids, shape representations and PRODUCT_DEFINITIONs, resolved once.
+
+    Built right after parsing, so the splitter looks these up instead of walking
+    referrers again for every solid and PD:
+      solid_ids          all solid bodies
+      abrep_of[solid]    the first ADVANCED_BREP_SHAPE_REPRESENTATION containing it
+      pd_of[solid]       its PRODUCT_DEFINITION, via ABREP -> SDR -> PDS -> PD or
+                         ABREP -> SRR -> SHAPE_REPRESENTATION -> SDR -> PDS -> PD
+      solids_by_pd[pd]   the inverse of pd_of, in solid order
+      shape_solids[pd]   solids found forward from a PD: PD -> PDS -> SDR -> shape
+                         representation (-> SRR -> ABREP) -> solids
+    product_name() and product_structure() are computed once per PD and ABREP.
+    """
+
+    def __init__(self, parser: StepParser, solid_types: Iterable[str]):
+        self.parser = parser
+        solids: List[int] = []
+        for solid_type in solid_types:
+            solids.extend(parser.find_entities_by_type(solid_type))
+        self.solid_ids: Set[int] = set(solids)
+        self.abrep_of: Dict[int, int] = {}
+        self.pd_of: Dict[int, int] = {}
+        self.solids_by_pd: Dict[int, List[int]] = {}
+        self.shape_solids: Dict[int, List[int]] = {}
+        self._product_names: Dict[int, Optional[str]] = {}
+        self._product_structures: Dict[int, FrozenSet[int]] = {}
+
+        pd_of_abrep: Dict[int, Optional[int]] = {}
+        for solid_id in solids:
+            abrep_ids = parser.get_referrers(solid_id, "ADVANCED_BREP_SHAPE_REPRESENTATION")
+            if not abrep_ids:
+                continue
+            self.abrep_of[solid_id] = abrep_ids[0]
+            for abrep_id in abrep_ids:
+                if abrep_id not in pd_of_abrep:
+                    pd_of_abrep[abrep_id] = self._resolve_pd(abrep_id)
+                pd_id = pd_of_abrep[abrep_id]
+                if pd_id is not None:
+                    self.pd_of[solid_id] = pd_id
+                    self.solids_by_pd.setdefault(pd_id, []).append(solid_id)
+                    break
+
+        for pd_id in parser.find_entities_by_type("PRODUCT_DEFINITION"):
+            found = self._resolve_shape_solids(pd_id)
+            if found:
+                self.shape_solids[pd_id] = found
+
+    def _resolve_pd(self, abrep_id: int) -> Optional[int]:
+        """Find the PRODUCT_DEFINITION of an ABREP."""
+        parser = self.parser
+        # Method 1: Direct - Find SHAPE_DEFINITION_REPRESENTATION referencing this ABREP
+        for sdr_id in parser.get_referrers(abrep_id, "SHAPE_DEFINITION_REPRESENTATION"):
+            pd_id = self._pd_from_sdr(sdr_id)
+            if pd_id is not None:
+                return pd_id
+
+        # Method 2: Via SHAPE_REPRESENTATION_RELATIONSHIP
+        # Some STEP files link ADVANCED_BREP_SHAPE_REPRESENTATION to SHAPE_REPRESENTATION
+        # via SHAPE_REPRESENTATION_RELATIONSHIP, then SDR references the SHAPE_REPRESENTATION
+        for srr_id in parser.get_referrers(abrep_id, "SHAPE_REPRESENTATION_RELATIONSHIP"):
+            for shape_rep_id in parser.entities[srr_id].references:
+                if shape_rep_id == abrep_id or parser.get_entity_type(shape_rep_id) != "SHAPE_REPRESENTATION":
+                    continue
+                for sdr_id in parser.get_referrers(shape_rep_id, "SHAPE_DEFINITION_REPRESENTATION"):
+                    pd_id = self._pd_from_sdr(sdr_id)
+                    if pd_id is not None:
+                        return pd_id
+        return None
+
+    def _pd_from_sdr(self, sdr_id: int) -> Optional[int]:
+        """Follow SHAPE_DEFINITION_REPRESENTATION -> PRODUCT_DEFINITION_SHAPE -> PRODUCT_DEFINITION."""
+        parser = self.parser
+        for ref in parser.entities[sdr_id].references:
+            if parser.get_entity_type(ref) == "PRODUCT_DEFINITION_SHAPE":
+                for pds_ref in parser.entities[ref].references:
+                    if parser.get_entity_type(pds_ref) == "PRODUCT_DEFINITION":
+                        return pds_ref
+        return None
+
+    def _resolve_shape_solids(self, pd_id: int) -> List[int]:
+        """Find the solids reached from a PRODUCT_DEFINITION through its shape representations."""
+        parser = self.parser
+        solid_ids = self.solid_ids
+        found_solids = []
+
+        # Find PRODUCT_DEFINITION_SHAPE referencing this PD
+        for pds_id in parser.get_referrers(pd_id, "PRODUCT_DEFINITION_SHAPE"):
+            # Find SHAPE_DEFINITION_REPRESENTATION referencing this PDS
+            for sdr_id in parser.get_referrers(pds_id, "SHAPE_DEFINITION_REPRESENTATION"):
+                # Find the SHAPE_REPRESENTATION or ABREP referenced by SDR
+                for sdr_ref in parser.entities[sdr_id].references:
+                    if sdr_ref == pds_id:
+                        continue
+                    sr_entity = parser.entities.get(sdr_ref)
+                    if not sr_entity:
+                        continue
+
+                    if sr_entity.type == "ADVANCED_BREP_SHAPE_REPRESENTATION":
+                        # Direct ABREP - collect solids from it
+                        found_solids.extend(ref for ref in sr_entity.references if ref in solid_ids)
+
+                    elif sr_entity.type == "SHAPE_REPRESENTATION":
+                        # Check if solids are directly in this SR
+                        found_solids.extend(ref for ref in sr_entity.references if ref in solid_ids)
+
+                        # Also follow SHAPE_REPRESENTATION_RELATIONSHIP to ABREP
+                        for srr_id in parser.get_referrers(sdr_ref, "SHAPE_REPRESENTATION_RELATIONSHIP"):
+                            for srr_ref in parser.entities[srr_id].references:
+                                if srr_ref == sdr_ref:
+                                    continue
+                                abrep = parser.entities.get(srr_ref)
+                                if abrep and abrep.type == "ADVANCED_BREP_SHAPE_REPRESENTATION":
+                                    found_solids.extend(ref for ref in abrep.references if ref in solid_ids)
+
+        return found_solids
+
+    def product_name(self, pd_id: Optional[int]) -> Optional[str]:
+        """Name of the PRODUCT behind a PRODUCT_DEFINITION (via its formation)."""
+        if pd_id is None:
+            return None
+        if pd_id not in self._product_names:
+            self._product_names[pd_id] = self._resolve_product_name(pd_id)
+        return self._product_names[pd_id]
+
+    def _resolve_product_name(self, pd_id: int) -> Optional[str]:
+        parser = self.parser
+        product_def = parser.entities.get(pd_id)
+        if product_def is None:
+            return None
+        for ref in product_def.references:
+            if parser.get_entity_type(ref) in ("PRODUCT_DEFINITION_FORMATION_WITH_SPECIFIED_SOURCE",
+                                               "PRODUCT_DEFINITION_FORMATION"):
+                for prod_ref in parser.entities[ref].references:
+                    product = parser.entities.get(prod_ref)
+                    if product and product.type == "PRODUCT":
+                        match = re.search(r"'([^']+)'", product.content)
+                        if match:
+                            return match.group(1)
+        return None
+
+    def product_structure(self, abrep_id: Optional[int]) -> FrozenSet[int]:
+        """PRODUCT_DEFINITION and related entities for the solids of an ABREP.
+
+        This creates the product wrapper that OpenCASCADE requires:
+        APPLICATION_CONTEXT -> PRODUCT_DEFINITION_CONTEXT -> PRODUCT_DEFINITION
+        -> PRODUCT_DEFINITION_FORMATION -> PRODUCT
+        -> PRODUCT_DEFINITION_SHAPE -> SHAPE_DEFINITION_REPRESENTATION
+        """
+        if not abrep_id:
+            return frozenset()
+        structure = self._product_structures.get(abrep_id)
+        if structure is None:
+            entities: Set[int] = set()
+            self._add_product_structure(entities, abrep_id)
+            structure = self._product_structures[abrep_id] = frozenset(entities)
+        return structure
+
+    def _add_product_structure(self, entities: Set[int], abrep_id: int) -> None:
+        parser = self.parser
+        # Find SHAPE_REPRESENTATION linked to this ABREP
+        # Method 1: Direct SDR referencing ABREP
+        for sdr_id in parser.get_referrers(abrep_id, "SHAPE_DEFINITION_REPRESENTATION"):
+            entities.add(sdr_id)
+            self._add_sdr_chain(entities, sdr_id)
+            return
+
+        # Method 2: Via SHAPE_REPRESENTATION_RELATIONSHIP
+        for srr_id in parser.get_referrers(abrep_id, "SHAPE_REPRESENTATION_RELATIONSHIP"):
+            entities.add(srr_id)
+            # Find SHAPE_REPRESENTATION linked by this relationship
+            for shape_rep_id in parser.entities[srr_id].references:
+                if shape_rep_id == abrep_id:
+                    continue
+                if parser.get_entity_type(shape_rep_id) == "SHAPE_REPRESENTATION":
+                    entities.add(shape_rep_id)
+                    entities.update(parser.get_transitive_dependencies(shape_rep_id))
+                    # Find SDR referencing this SHAPE_REPRESENTATION
+                    for sdr_id in parser.get_referrers(shape_rep_id, "SHAPE_DEFINITION_REPRESENTATION"):
+                        entities.add(sdr_id)
+                        self._add_sdr_chain(entities, sdr_id)
+                        return
+
+    def _add_sdr_chain(self, entities: Set[int], sdr_id: int) -> None:
+        """Add the full product chain from a SHAPE_DEFINITION_REPRESENTATION."""
+        parser = self.parser
+        for ref in parser.entities[sdr_id].references:
+            if parser.get_entity_type(ref) != "PRODUCT_DEFINITION_SHAPE":
+                continue
+            entities.add(ref)
+            # Get PRODUCT_DEFINITION
+            for pd_id in parser.entities[ref].references:
+                if parser.get_entity_type(pd_id) != "PRODUCT_DEFINITION":
+                    continue
+                entities.add(pd_id)
+                # Add all transitive deps of PRODUCT_DEFINITION
+                # (PRODUCT_DEFINITION_FORMATION, PRODUCT, PRODUCT_CONTEXT,
+                #  APPLICATION_CONTEXT, APPLICATION_PROTOCOL_DEFINITION, etc.)
+                entities.update(parser.get_transitive_dependencies(pd_id))
+
+                # Also find PROPERTY_DEFINITION entities referencing this PD
+                for prop_id in parser.get_referrers(pd_id, "PROPERTY_DEFINITION"):
+                    entities.add(prop_id)
+                    entities.update(parser.get_transitive_dependencies(prop_id))
+                    # Find PROPERTY_DEFINITION_REPRESENTATION
+                    for pdr_id in parser.get_referrers(prop_id, "PROPERTY_DEFINITION_REPRESENTATION"):
+                        entities.add(pdr_id)
+                        entities.update(parser.get_transitive_dependencies(pdr_id))
+
+
+class StyledItemIndex:
+    """STYLED_ITEMs by the entities they reference, with the closure of each item's styles.
+
+    Built once per split, so collecting the styling of a part looks up the entities
+    of its geometry in one map instead of the typed referrers of each of them, and
+    the styling chain of an item (PRESENTATION_STYLE_ASSIGNMENT, SURFACE_STYLE_USAGE,
+    FILL_AREA_STYLE, COLOUR_RGB, ...) is walked once.
+    """
+
+    def __init__(self, parser: StepParser):
+        self.parser = parser
+        self.items_by_ref: Dict[int, List[int]] = {}
+        for item_id in parser.find_entities_by_type("STYLED_ITEM"):
+            for ref in parser.entities[item_id].references:
+                self.items_by_ref.setdefault(ref, []).append(item_id)
+        self._style_closures: Dict[int, Tuple[FrozenSet[int], Optional[int]]] = {}
+
+    def _style_closure(self, item_id: int) -> Tuple[FrozenSet[int], Optional[int]]:
+        """The closure of an item's styles and its styled item (its last reference)."""
+        cached = self._style_closures.get(item_id)
+        if cached is None:
+            refs = self.parser.entities[item_id].references
+            target = refs[-1] if refs else None
+            cached = (frozenset(self.parser.get_transitive_dependencies_many(refs[:-1])), target)
+            self._style_closures[item_id] = cached
+        return cached
+
+    def add_styling(self, entities: Set[int], geometry: AbstractSet[int]) -> None:
+        """Add the STYLED_ITEMs referencing any entity of geometry, and their styles."""
+        items_by_ref = self.items_by_ref
+        if len(geometry) <= len(items_by_ref):
+            styled_refs = [ref for ref in geometry if ref in items_by_ref]
+        else:
+            styled_refs = [ref for ref in items_by_ref if ref in geometry]
+        item_ids = set()
+        for ref in styled_refs:
+            item_ids.update(items_by_ref[ref])
+
+        for item_id in item_ids:
+            entities.add(item_id)
+            styles, target = self._style_closure(item_id)
+            refs = self.parser.entities[item_id].references
+            if any(ref in geometry for ref in refs[:-1]):
+                # Unusual: a style is part of the geometry; only add what is outside it
+                entities.update(self.parser.get_transitive_dependencies_many(
+                    ref for ref in refs if ref not in geometry))
+                continue
+            entities.update(styles)
+            if target is not None and target not in geometry:
+                entities.update(self.parser.get_transitive_dependencies(target))
+
+
+# Splitter of a forked pool worker; set only in the child process (see _init_worker)
+_worker_splitter: Optional['StepSplitter'] = None
+
+
+def _init_worker(splitter: 'StepSplitter') -> None:
+    global _worker_splitter
+    _worker_splitter = splitter
+
+
+def _export_part_in_worker(export: PartExport, splitter: Optional['StepSplitter'] = None) -> PartExport:
+    return (splitter or _worker_splitter)._export_part(export)
+
+
+def _hash_solid_in_worker(solid_id: int, splitter: Optional['StepSplitter'] = None) -> str:
+    return (splitter or _worker_splitter).hasher.compute_geometry_hash(solid_id)
+
+
+def _signature_in_worker(solid_id: int, splitter: Optional['StepSplitter'] = None) -> Tuple:
+    return (splitter or _worker_splitter).hasher.compute_signature(solid_id)
+
 
 class StepSplitter:
     """Main class for splitting STEP files into individual parts or volumes."""
@@ -280,10 +1928,46 @@ class StepSplitter:
     # Solid body entity types
     SOLID_TYPES = {"MANIFOLD_SOLID_BREP", "BREP_WITH_VOIDS"}
 
-    def __init__(self):
-        self.parser = StepParser()
+    # Dedup key prefix of solids told apart by their signature alone (no geometry hash)
+    UNIQUE_KEY_PREFIX = "unique-"
+
+    # Format version of the incremental-mode part manifest
+    MANIFEST_VERSION = 1
+
+    # Geometry hashers selectable for duplicate detection
+    HASH_MODES = {"flat": GeometryHasher, "merkle": MerkleGeometryHasher,
+                  "placement": PlacementInvariantHasher}
+
+    def __init__(self, lazy: bool = False, jobs: int = 1, hash_mode: str = "flat",
+                 output_format: str = "stp", compress_level: int = PartOutput.COMPRESS_LEVEL,
+                 cache: Optional[ParseCache] = None, incremental: bool = False,
+                 selection: Optional[PartSelection] = None, profile: bool = False,
+                 cprofile: bool = False, store: Optional[PartStore] = None):
+        self.parser = StepParser(lazy=lazy, cache=cache)
         self.writer = StepWriter()
+        self.jobs = jobs
+        self.hash_mode = hash_mode
         self.hasher = None
+        self.output_format = output_format
+        self.compress_level = compress_level
+        self.output = None
+        # Solid <-> PD links and STYLED_ITEMs by entity, built once per split
+        self.structure: Optional[ProductStructureIndex] = None
+        self.styles: Optional[StyledItemIndex] = None
+        # Phase timings; written next to the report with profile (and cProfile stats with cprofile)
+        self.profile = profile or cprofile
+        self.profiler = SplitProfiler(cprofile=cprofile)
+        # Only split these parts (None or empty: all)
+        self.selection = selection if selection else None
+        # Incremental mode: only rewrite parts whose manifest digest changed
+        self.incremental = incremental
+        self.previous_manifest: Optional[Dict[str, dict]] = None
+        self.manifest: Dict[str, dict] = {}
+        self.unchanged_parts = 0
+        # Part store: link known parts instead of writing them (store key of each exported part)
+        self.store = store
+        self.store_keys: List[Optional[str]] = []
+        self.store_hits = 0
         self.part_report = []  # List of (name, count) tuples
 
     def _find_all_solid_bodies(self) -> List[int]:
@@ -300,36 +1984,98 @@ class StepSplitter:
 
     def split(self, input_path: str, output_dir: str) -> None:
         """Analyze and split a STEP file into individual components."""
+        if self.jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            print("Parallel processing needs the 'fork' start method; running serially")
+            self.jobs = 1
+
         print(f"Parsing STEP file: {input_path}")
-        self.parser.parse(input_path)
-        self.hasher = GeometryHasher(self.parser)
+        with self.profiler.phase("parse"):
+            self.parser.parse(input_path)
+        self.profiler.count("input_bytes", os.path.getsize(input_path))
+        self.split_parsed(output_dir)
+
+    def split_parsed(self, output_dir: str) -> None:
+        """Split the file already parsed into self.parser (e.g. one kept by SplitService)."""
+        self.hasher = self.HASH_MODES[self.hash_mode](self.parser)
         self.part_report = []
+        with self.profiler.phase("product_structure"):
+            self.structure = ProductStructureIndex(self.parser, self.SOLID_TYPES)
+        with self.profiler.phase("styled_items"):
+            self.styles = StyledItemIndex(self.parser)
 
         os.makedirs(output_dir, exist_ok=True)
 
         base_name = self.parser.original_filename
-
-        # Check for assembly (NEXT_ASSEMBLY_USAGE_OCCURRENCE)
-        assembly_occurrences = self.parser.find_entities_by_type("NEXT_ASSEMBLY_USAGE_OCCURRENCE")
-
-        if assembly_occurrences:
-            print(f"Detected ASSEMBLY with {len(assembly_occurrences)} component references")
-            self._split_assembly(output_dir, base_name)
-        else:
-            # Check for multiple volumes/solids
-            solid_bodies = self._find_all_solid_bodies()
-
-            if len(solid_bodies) > 1:
-                print(f"Detected PART with {len(solid_bodies)} solid bodies/volumes")
-                self._split_multi_volume_part(output_dir, base_name, solid_bodies)
-            elif len(solid_bodies) == 1:
-                print("Single solid body detected - exporting as single part file")
-                self._export_single_part(output_dir, base_name, solid_bodies[0])
+        self.output = PartOutput(output_dir, base_name, self.output_format, self.compress_level)
+
+        incremental = self.incremental
+        if incremental and not self.output.parallel:
+            print("Incremental mode does not apply to archive output; writing all parts")
+            incremental = False
+        manifest_path = os.path.join(output_dir, f"{base_name}.manifest.json")
+        self.previous_manifest = self._read_manifest(manifest_path) if incremental else None
+        self.manifest = {}
+        self.unchanged_parts = 0
+        self.store_keys = []
+        self.store_hits = 0
+        if self.store is not None and not self.output.parallel:
+            print("The part store does not apply to archive output; writing all parts")
+
+        try:
+            # Check for assembly (NEXT_ASSEMBLY_USAGE_OCCURRENCE)
+            assembly_occurrences = self.parser.find_entities_by_type("NEXT_ASSEMBLY_USAGE_OCCURRENCE")
+
+            if assembly_occurrences:
+                print(f"Detected ASSEMBLY with {len(assembly_occurrences)} component references")
+                self._split_assembly(output_dir, base_name)
             else:
-                print("No solid body entities found")
+                # Check for multiple volumes/solids
+                solid_bodies = self._find_all_solid_bodies()
+
+                if len(solid_bodies) > 1:
+                    print(f"Detected PART with {len(solid_bodies)} solid bodies/volumes")
+                    self._split_multi_volume_part(output_dir, base_name, solid_bodies)
+                elif len(solid_bodies) == 1:
+                    print("Single solid body detected - exporting as single part file")
+                    self._export_single_part(output_dir, base_name, solid_bodies[0])
+                else:
+                    print("No solid body entities found")
+        finally:
+            self.output.close()
+        if self.output.archive_path:
+            print(f"\nArchive saved to: {os.path.basename(self.output.archive_path)}")
+        report = self._report_rows()
+        if incremental:
+            report = self._finish_incremental(output_dir, manifest_path, report)
+        if self.store is not None and self.output.parallel:
+            print(f"Part store: {self.store_hits} of {len(self.store_keys)} parts linked from "
+                  f"{self.store.directory}")
 
         # Write report file
-        self._write_report(output_dir, base_name)
+        with self.profiler.phase("report"):
+            self._write_report(output_dir, base_name, report)
+
+        if self.profile:
+            self._write_profile(output_dir, base_name)
+
+    def _write_profile(self, output_dir: str, base_name: str) -> None:
+        """Write <base_name>.profile.json (and <base_name>.prof with cProfile) next to the report."""
+        profiler = self.profiler
+        profiler.count("entities", len(self.parser.entities))
+        profiler.count("solids", len(self._find_all_solid_bodies()))
+        profiler.count("unique_parts", len(self.part_report))
+        profiler.count("instances", sum(count for _, count in self.part_report))
+        written = sum(part["bytes"] for part in profiler.parts)
+        if self.output.archive_path:
+            written += os.path.getsize(self.output.archive_path)
+        profiler.count("output_bytes", written)
+
+        json_path = os.path.join(output_dir, f"{base_name}.profile.json")
+        profile_path = os.path.join(output_dir, f"{base_name}.prof")
+        profiler.write(json_path, profile_path)
+        print(f"Profile saved to: {os.path.basename(json_path)}")
+        if profiler.profile is not None:
+            print(f"cProfile stats saved to: {os.path.basename(profile_path)}")
 
     def _build_nauo_tree(self) -> Tuple[Dict[int, List[int]], int]:
         """Build the NAUO parent-child tree and find the root assembly PD.
@@ -353,14 +2099,10 @@ class StepSplitter:
             if not nauo:
                 continue
 
-            # Parse NAUO content to extract ordered PD references
             # NAUO('id','name','desc',#parent_pd,#child_pd,$)
-            # Extract all #xxx references in order from the full line
-            ordered_refs = [int(m.group(1)) for m in re.finditer(r'#(\d+)', nauo.content)]
-
-            # Filter to only PRODUCT_DEFINITION refs (in order)
+            # References are kept in file order; filter to only PRODUCT_DEFINITION refs
             pd_refs = []
-            for ref in ordered_refs:
+            for ref in nauo.references:
                 ref_entity = self.parser.entities.get(ref)
                 if ref_entity and ref_entity.type == "PRODUCT_DEFINITION":
                     pd_refs.append(ref)
@@ -392,23 +2134,41 @@ class StepSplitter:
 
         For each PRODUCT_DEFINITION that is a leaf (not a parent in children_map),
         computes the total number of times it appears in the full assembly by
-        multiplying through the hierarchy.
+        multiplying through the hierarchy. All PDs are counted in one topological
+        pass over the NAUO DAG, in time linear in the number of NAUOs.
 
         Returns:
             Dict mapping leaf PD id -> total recursive count
         """
         leaf_counts: Dict[int, int] = {}
 
-        def _count_leaf(target_pd: int, context_pd: int) -> int:
-            """Count how many times target_pd appears under context_pd."""
-            total = 0
-            for child_pd in children_map.get(context_pd, []):
-                if child_pd == target_pd:
-                    total += 1
-                else:
-                    # Each NAUO placement of this sub-assembly contributes its sub-count
-                    total += _count_leaf(target_pd, child_pd)
-            return total
+        # In-degrees (one per NAUO) over the part of the DAG reachable from the root
+        indegree: Dict[int, int] = {root_pd: 0}
+        stack = [root_pd]
+        while stack:
+            parent = stack.pop()
+            for child in children_map.get(parent, ()):
+                if child not in indegree:
+                    indegree[child] = 0
+                    stack.append(child)
+                indegree[child] += 1
+
+        # Topological pass: a PD's multiplicity is the sum over its NAUOs of the
+        # parent's multiplicity, i.e. the number of placements in the full assembly
+        multiplicity: Dict[int, int] = {root_pd: 1}
+        ready = [root_pd]
+        while ready:
+            parent = ready.pop()
+            parent_count = multiplicity[parent]
+            for child in children_map.get(parent, ()):
+                multiplicity[child] = multiplicity.get(child, 0) + parent_count
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+
+        cyclic = {pd for pd, remaining in indegree.items() if remaining > 0}
+        if cyclic:
+            print(f"  Warning: assembly structure has a cycle; {len(cyclic)} PDs are not counted")
 
         # Find all leaf PDs (appear as children but not as parents)
         all_pds = set()
@@ -420,67 +2180,85 @@ class StepSplitter:
         leaf_pds = {pd for pd in all_pds if pd not in children_map}
 
         for leaf_pd in leaf_pds:
-            count = _count_leaf(leaf_pd, root_pd)
-            if count > 0:
+            count = multiplicity.get(leaf_pd, 0)
+            if count > 0 and leaf_pd not in cyclic:
                 leaf_counts[leaf_pd] = count
 
         return leaf_counts
 
+    def _select_leaf_pds(self, children_map: Dict[int, List[int]], root_pd: int,
+                         leaf_counts: Dict[int, int]) -> Set[int]:
+        """Return the leaf PDs allowed by the PD and subtree filters of the selection."""
+        selection = self.selection
+        selected = set(leaf_counts)
+        if selection.pd_ids:
+            selected &= self._leaves_below(children_map, selection.pd_ids)
+        if selection.subtrees:
+            roots: Set[int] = set()
+            for path in selection.subtrees:
+                roots |= self._resolve_subtree(children_map, root_pd, path)
+            selected &= self._leaves_below(children_map, roots)
+        return selected
+
+    def _leaves_below(self, children_map: Dict[int, List[int]], pd_ids: Iterable[int]) -> Set[int]:
+        """Return the leaf PDs in the subtrees of the given PDs (a leaf PD stands for itself)."""
+        leaves: Set[int] = set()
+        visited: Set[int] = set()
+        stack = list(pd_ids)
+        while stack:
+            pd_id = stack.pop()
+            if pd_id in visited:
+                continue
+            visited.add(pd_id)
+            children = children_map.get(pd_id)
+            if children:
+                stack.extend(children)
+            else:
+                leaves.add(pd_id)
+        return leaves
+
+    def _resolve_subtree(self, children_map: Dict[int, List[int]], root_pd: int,
+                         path: List[str]) -> Set[int]:
+        """Return the PDs reached by following product name patterns down from the root."""
+        if not path:
+            return {root_pd}
+        names: Dict[int, str] = {}
+
+        def name_of(pd_id: int) -> str:
+            if pd_id not in names:
+                names[pd_id] = (self.structure.product_name(pd_id) or "").lower()
+            return names[pd_id]
+
+        # The root assembly's own name may lead the path
+        level = {root_pd}
+        if fnmatch.fnmatchcase(name_of(root_pd), path[0].lower()):
+            path = path[1:]
+        for pattern in path:
+            pattern = pattern.lower()
+            level = {child for pd_id in level for child in children_map.get(pd_id, ())
+                     if fnmatch.fnmatchcase(name_of(child), pattern)}
+        return level
+
+    def _select_solids(self, solid_ids: List[int]) -> List[int]:
+        """Filter the solids of a (multi-volume) part by the name and PD filters of the selection."""
+        selection = self.selection
+        selected = []
+        for solid_id in solid_ids:
+            if selection.pd_ids and self._find_product_definition_for_solid(solid_id) not in selection.pd_ids:
+                continue
+            if selection.names and not selection.matches_name(self._get_solid_name(solid_id),
+                                                              self._find_product_for_solid(solid_id)):
+                continue
+            selected.append(solid_id)
+        return selected
+
     def _find_solids_for_pd(self, pd_id: int) -> List[int]:
         """Find all solid bodies associated with a PRODUCT_DEFINITION.
 
         Follows the chain: PD -> PDS -> SDR -> SR/ABREP -> solids
         Also follows SHAPE_REPRESENTATION_RELATIONSHIP links.
         """
-        all_solid_ids = set(self._find_all_solid_bodies())
-        found_solids = []
-
-        # Find PRODUCT_DEFINITION_SHAPE referencing this PD
-        for pds_id in self.parser.find_entities_by_type("PRODUCT_DEFINITION_SHAPE"):
-            pds = self.parser.entities.get(pds_id)
-            if not pds or pd_id not in pds.references:
-                continue
-
-            # Find SHAPE_DEFINITION_REPRESENTATION referencing this PDS
-            for sdr_id in self.parser.find_entities_by_type("SHAPE_DEFINITION_REPRESENTATION"):
-                sdr = self.parser.entities.get(sdr_id)
-                if not sdr or pds_id not in sdr.references:
-                    continue
-
-                # Find the SHAPE_REPRESENTATION or ABREP referenced by SDR
-                for sdr_ref in sdr.references:
-                    if sdr_ref == pds_id:
-                        continue
-                    sr_entity = self.parser.entities.get(sdr_ref)
-                    if not sr_entity:
-                        continue
-
-                    if sr_entity.type == "ADVANCED_BREP_SHAPE_REPRESENTATION":
-                        # Direct ABREP - collect solids from it
-                        for ref in sr_entity.references:
-                            if ref in all_solid_ids:
-                                found_solids.append(ref)
-
-                    elif sr_entity.type == "SHAPE_REPRESENTATION":
-                        # Check if solids are directly in this SR
-                        for ref in sr_entity.references:
-                            if ref in all_solid_ids:
-                                found_solids.append(ref)
-
-                        # Also follow SHAPE_REPRESENTATION_RELATIONSHIP to ABREP
-                        for srr_id in self.parser.find_entities_by_type("SHAPE_REPRESENTATION_RELATIONSHIP"):
-                            srr = self.parser.entities.get(srr_id)
-                            if srr and sdr_ref in srr.references:
-                                for srr_ref in srr.references:
-                                    if srr_ref == sdr_ref:
-                                        continue
-                                    abrep = self.parser.entities.get(srr_ref)
-                                    if abrep and abrep.type == "ADVANCED_BREP_SHAPE_REPRESENTATION":
-                                        for ref in abrep.references:
-                                            if ref in all_solid_ids:
-                                                found_solids.append(ref)
-
-        return found_solids
+        return list(self.structure.shape_solids.get(pd_id, ()))
 
     def _split_assembly(self, output_dir: str, base_name: str) -> None:
         """Split an assembly into individual parts with duplicate detection.
@@ -490,67 +2268,30 @@ class StepSplitter:
         solid as a separate file.
         """
         # Build the NAUO parent-child tree
-        children_map, root_pd = self._build_nauo_tree()
+        with self.profiler.phase("assembly_tree"):
+            children_map, root_pd = self._build_nauo_tree()
         print(f"  Assembly tree: root PD #{root_pd}")
 
         # Compute recursive occurrence counts for all leaf PDs
-        leaf_counts = self._compute_recursive_counts(children_map, root_pd)
+        with self.profiler.phase("occurrence_counts"):
+            leaf_counts = self._compute_recursive_counts(children_map, root_pd)
         print(f"  Found {len(leaf_counts)} leaf parts in assembly hierarchy")
 
-        # For each leaf PD, find its associated solids
-        # A leaf PD may have 1 solid (normal) or many (e.g., bearings with 14 solids)
-        # solid_info: solid_id -> (display_name, recursive_count, pd_id)
-        solid_info: Dict[int, Tuple[str, int, int]] = {}
-
-        for pd_id, count in leaf_counts.items():
-            product_name = self._extract_product_name(self.parser.entities[pd_id])
-            solids_for_pd = self._find_solids_for_pd(pd_id)
-
-            if not solids_for_pd:
-                # Try finding solids the old way (via ABREP referencing the solid)
-                all_solids = self._find_all_solid_bodies()
-                for solid_id in all_solids:
-                    found_pd = self._find_product_definition_for_solid(solid_id)
-                    if found_pd == pd_id:
-                        solids_for_pd.append(solid_id)
+        selection = self.selection
+        if selection and (selection.pd_ids or selection.subtrees):
+            selected_pds = self._select_leaf_pds(children_map, root_pd, leaf_counts)
+            leaf_counts = {pd_id: count for pd_id, count in leaf_counts.items() if pd_id in selected_pds}
+            print(f"  Selected {len(leaf_counts)} leaf parts")
 
-            if len(solids_for_pd) == 1:
-                # Single solid - use product name
-                solid_id = solids_for_pd[0]
-                name = product_name or self._get_solid_name(solid_id) or f"{base_name}_{solid_id}"
-                solid_info[solid_id] = (name, count, pd_id)
-            elif len(solids_for_pd) > 1:
-                # Multi-solid part (e.g., bearing with balls, races, etc.)
-                # Each solid gets its own file. Use solid's own name or entity type + ID.
-                for solid_id in solids_for_pd:
-                    solid_name = self._get_solid_name(solid_id)
-                    entity = self.parser.entities.get(solid_id)
-                    if solid_name:
-                        name = solid_name
-                    elif entity:
-                        # Fallback: ENTITY_TYPE_entityID (e.g., MANIFOLD_SOLID_BREP_17831)
-                        name = f"{entity.type}_{solid_id}"
-                    else:
-                        name = f"SOLID_{solid_id}"
-                    solid_info[solid_id] = (name, count, pd_id)
-            else:
-                print(f"  Warning: No solids found for PD #{pd_id} ({product_name})")
-
-        # Also check for solids not associated with any leaf PD but referenced by NAUO
-        # (fallback for files where the PD→solid chain is different)
-        all_solids = self._find_all_solid_bodies()
-        covered_solids = set(solid_info.keys())
-        for solid_id in all_solids:
-            if solid_id in covered_solids:
-                continue
-            pd_id = self._find_product_definition_for_solid(solid_id)
-            if pd_id and pd_id in leaf_counts:
-                product_name = self._find_product_for_solid(solid_id)
-                name = product_name or self._get_solid_name(solid_id) or f"{base_name}_{solid_id}"
-                solid_info[solid_id] = (name, leaf_counts[pd_id], pd_id)
+        # For each leaf PD, find its associated solids
+        with self.profiler.phase("find_solids"):
+            solid_info = self._find_assembly_solids(leaf_counts, base_name)
 
         if not solid_info:
-            print("  No parts found in assembly hierarchy")
+            if selection:
+                print("  No parts match the selection")
+            else:
+                print("  No parts found in assembly hierarchy")
             return
 
         # Compute geometry hashes for duplicate detection
@@ -558,9 +2299,11 @@ class StepSplitter:
         # are never merged (they represent physically distinct placements)
         print("Computing geometry hashes for duplicate detection...")
         hash_to_solids: Dict[str, List[Tuple[int, str, int]]] = {}
+        geo_hashes = self._compute_dedup_hashes(list(solid_info),
+                                                [info[2] for info in solid_info.values()])
 
-        for solid_id, (display_name, count, pd_id) in solid_info.items():
-            geo_hash = self.hasher.compute_geometry_hash(solid_id)
+        solid_order = {solid_id: i for i, solid_id in enumerate(solid_info)}
+        for geo_hash, (solid_id, (display_name, count, pd_id)) in zip(geo_hashes, solid_info.items()):
             # Combine geometry hash with PD to prevent cross-PD merging
             dedup_key = f"{geo_hash}_{pd_id}"
             if dedup_key not in hash_to_solids:
@@ -577,6 +2320,7 @@ class StepSplitter:
         # Export unique parts
         unique_count = 0
         total_instances = 0
+        exports: List[PartExport] = []
 
         for dedup_key, solids_list in hash_to_solids.items():
             # For geometrically identical solids within the same PD, take the max count
@@ -587,26 +2331,20 @@ class StepSplitter:
             solid_id, display_name, _ = solids_list[0]
             unique_count += 1
 
-            # Collect dependencies
-            dependencies, context_id = self._collect_solid_dependencies(solid_id)
-
             # Generate filename
             sanitized = self._sanitize_filename(display_name)
             if name_usage_count.get(sanitized, 1) > 1:
                 output_filename = f"{sanitized}-{solid_id}.stp"
             else:
                 output_filename = f"{sanitized}.stp"
-            output_filepath = os.path.join(output_dir, output_filename)
+            output_filepath = self.output.part_path(output_filename)
 
             if total_count > 1:
-                print(f"Extracting part: {display_name} (x{total_count} instances)")
+                message = f"Extracting part: {display_name} (x{total_count} instances)"
             else:
-                print(f"Extracting part: {display_name}")
-
-            self.writer.write_step_file(output_filepath, display_name, dependencies, self.parser,
-                                        solid_id=solid_id if context_id else None,
-                                        context_id=context_id)
-            print(f"  -> Saved to: {output_filename}")
+                message = f"Extracting part: {display_name}"
+            exports.append(PartExport(solid_id, display_name, output_filepath, message,
+                                      geometry_hash=geo_hashes[solid_order[solid_id]]))
 
             # Add to report
             if name_usage_count.get(sanitized, 1) > 1:
@@ -615,17 +2353,84 @@ class StepSplitter:
                 report_name = display_name
             self.part_report.append((report_name, total_count))
 
+        self._export_parts(exports)
         print(f"\nExtracted {unique_count} unique parts from {total_instances} total instances")
 
+    def _find_assembly_solids(self, leaf_counts: Dict[int, int],
+                              base_name: str) -> Dict[int, Tuple[str, int, int]]:
+        """Map the solids of the (selected) leaf PDs to (display_name, recursive_count, pd_id)."""
+        selection = self.selection
+        # A leaf PD may have 1 solid (normal) or many (e.g., bearings with 14 solids)
+        # solid_info: solid_id -> (display_name, recursive_count, pd_id)
+        solid_info: Dict[int, Tuple[str, int, int]] = {}
+
+        for pd_id, count in leaf_counts.items():
+            product_name = self.structure.product_name(pd_id)
+            solids_for_pd = self._find_solids_for_pd(pd_id)
+
+            if not solids_for_pd:
+                # Try finding solids the old way (via ABREP referencing the solid)
+                solids_for_pd = list(self.structure.solids_by_pd.get(pd_id, ()))
+
+            if len(solids_for_pd) == 1:
+                # Single solid - use product name
+                solid_id = solids_for_pd[0]
+                name = product_name or self._get_solid_name(solid_id) or f"{base_name}_{solid_id}"
+                if selection and not selection.matches_name(name, product_name):
+                    continue
+                solid_info[solid_id] = (name, count, pd_id)
+            elif len(solids_for_pd) > 1:
+                # Multi-solid part (e.g., bearing with balls, races, etc.)
+                # Each solid gets its own file. Use solid's own name or entity type + ID.
+                for solid_id in solids_for_pd:
+                    solid_name = self._get_solid_name(solid_id)
+                    entity = self.parser.entities.get(solid_id)
+                    if solid_name:
+                        name = solid_name
+                    elif entity:
+                        # Fallback: ENTITY_TYPE_entityID (e.g., MANIFOLD_SOLID_BREP_17831)
+                        name = f"{entity.type}_{solid_id}"
+                    else:
+                        name = f"SOLID_{solid_id}"
+                    if selection and not selection.matches_name(name, product_name):
+                        continue
+                    solid_info[solid_id] = (name, count, pd_id)
+            else:
+                print(f"  Warning: No solids found for PD #{pd_id} ({product_name})")
+
+        # Also check for solids not associated with any leaf PD but referenced by NAUO
+        # (fallback for files where the PD→solid chain is different)
+        all_solids = self._find_all_solid_bodies()
+        covered_solids = set(solid_info.keys())
+        for solid_id in all_solids:
+            if solid_id in covered_solids:
+                continue
+            pd_id = self._find_product_definition_for_solid(solid_id)
+            if pd_id and pd_id in leaf_counts:
+                product_name = self._find_product_for_solid(solid_id)
+                name = product_name or self._get_solid_name(solid_id) or f"{base_name}_{solid_id}"
+                if selection and not selection.matches_name(name, product_name):
+                    continue
+                solid_info[solid_id] = (name, leaf_counts[pd_id], pd_id)
+
+        return solid_info
+
     def _split_multi_volume_part(self, output_dir: str, base_name: str,
                                   solid_bodies: List[int]) -> None:
         """Split a part with multiple volumes with duplicate detection."""
+        if self.selection:
+            solid_bodies = self._select_solids(solid_bodies)
+            print(f"  Selected {len(solid_bodies)} solid bodies")
+            if not solid_bodies:
+                print("  No parts match the selection")
+                return
+
         # Compute geometry hashes for duplicate detection
         print("Computing geometry hashes for duplicate detection...")
         hash_to_solids: Dict[str, List[int]] = {}
+        geo_hashes = self._compute_dedup_hashes(solid_bodies)
 
-        for solid_id in solid_bodies:
-            geo_hash = self.hasher.compute_geometry_hash(solid_id)
+        for solid_id, geo_hash in zip(solid_bodies, geo_hashes):
             if geo_hash not in hash_to_solids:
                 hash_to_solids[geo_hash] = []
             hash_to_solids[geo_hash].append(solid_id)
@@ -655,6 +2460,7 @@ class StepSplitter:
         # Export unique volumes
         unique_count = 0
         total_instances = len(solid_bodies)
+        exports: List[PartExport] = []
 
         for geo_hash, solids_list in hash_to_solids.items():
             count = len(solids_list)
@@ -663,9 +2469,6 @@ class StepSplitter:
             # Use the first solid
             solid_id = solids_list[0]
 
-            # Collect dependencies
-            dependencies, context_id = self._collect_solid_dependencies(solid_id)
-
             part_name = solid_to_name[solid_id]
             sanitized = self._sanitize_filename(part_name)
 
@@ -677,26 +2480,191 @@ class StepSplitter:
                 final_name = part_name
                 output_filename = f"{sanitized}.stp"
 
-            output_filepath = os.path.join(output_dir, output_filename)
+            output_filepath = self.output.part_path(output_filename)
 
             if count > 1:
-                print(f"Extracting volume {unique_count}: {final_name} (x{count} identical instances)")
+                message = f"Extracting volume {unique_count}: {final_name} (x{count} identical instances)"
             else:
-                print(f"Extracting volume {unique_count}: {final_name}")
-
-            self.writer.write_step_file(output_filepath, final_name, dependencies, self.parser,
-                                        solid_id=solid_id if context_id else None,
-                                        context_id=context_id)
-            print(f"  -> Saved to: {output_filename}")
+                message = f"Extracting volume {unique_count}: {final_name}"
+            exports.append(PartExport(solid_id, final_name, output_filepath, message,
+                                      geometry_hash=geo_hash))
 
             # Add to report
             self.part_report.append((final_name, count))
 
+        self._export_parts(exports)
         print(f"\nExtracted {unique_count} unique volumes from {total_instances} total instances")
 
+    def _map_ordered(self, worker: Callable, items: list, chunksize: int = 1,
+                     parallel: bool = True) -> Iterator:
+        """Apply a module-level worker function to items, yielding results in order.
+
+        With jobs > 1 (and parallel set) the items are processed on a pool forked
+        after parsing, so workers share the parsed entity store copy-on-write; the
+        pool's initializer hands this splitter to each child. Otherwise the worker
+        is called in this process with the splitter passed explicitly.
+        """
+        if parallel and self.jobs > 1 and len(items) > 1:
+            context = multiprocessing.get_context("fork")
+            with context.Pool(min(self.jobs, len(items)), initializer=_init_worker, initargs=(self,)) as pool:
+                yield from pool.imap(worker, items, chunksize)
+        else:
+            for item in items:
+                yield worker(item, self)
+
+    def _compute_geometry_hashes(self, solid_ids: List[int]) -> List[str]:
+        """Compute the geometry hash of every solid (in parallel if jobs > 1), in input order."""
+        chunksize = max(1, len(solid_ids) // (self.jobs * 4))
+        return list(self._map_ordered(_hash_solid_in_worker, solid_ids, chunksize))
+
+    def _compute_dedup_hashes(self, solid_ids: List[int],
+                              group_ids: Optional[List[int]] = None) -> List[str]:
+        """Compute a duplicate-detection key for every solid, in input order.
+
+        Solids are first grouped by a cheap signature (together with their
+        group_ids entry, if given). Only solids whose group has other members get
+        the full geometry hash; the others are unique and get a placeholder key.
+        A hasher without signatures only groups by group_ids, with no signature pass.
+        """
+        chunksize = max(1, len(solid_ids) // (self.jobs * 4))
+        if self.hasher.HAS_SIGNATURE:
+            with self.profiler.phase("signature"):
+                signatures = list(self._map_ordered(_signature_in_worker, solid_ids, chunksize))
+        else:
+            signatures = [()] * len(solid_ids)
+        if group_ids is not None:
+            signatures = list(zip(signatures, group_ids))
+
+        signature_counts: Dict[Tuple, int] = {}
+        for signature in signatures:
+            signature_counts[signature] = signature_counts.get(signature, 0) + 1
+
+        to_hash = [solid_id for solid_id, signature in zip(solid_ids, signatures)
+                   if signature_counts[signature] > 1]
+        with self.profiler.phase("geometry_hash"):
+            full_hashes = dict(zip(to_hash, self._compute_geometry_hashes(to_hash)))
+
+        print(f"  Signature stage: {len(solid_ids) - len(to_hash)} of {len(solid_ids)} solids "
+              f"unique without hashing")
+        if to_hash:
+            print(f"  Full hash stage: {len(to_hash)} solids hashed, "
+                  f"{len(to_hash) - len(set(full_hashes.values()))} found to be duplicates")
+
+        return [full_hashes.get(solid_id, f"{self.UNIQUE_KEY_PREFIX}{solid_id}") for solid_id in solid_ids]
+
+    def _export_parts(self, exports: List[PartExport]) -> None:
+        """Collect dependencies and write every part (in parallel if jobs > 1).
+
+        Progress is printed in export order either way. Parts going into a single
+        archive are always written by this process.
+        """
+        with self.profiler.phase("export"):
+            for export in self._map_ordered(_export_part_in_worker, exports, parallel=self.output.parallel):
+                self._record_export(export)
+
+    def _record_export(self, export: PartExport) -> None:
+        """Print an exported part's progress and add it to the manifest and profile."""
+        print(export.message)
+        filename = os.path.basename(export.output_path)
+        self.store_keys.append(export.store_key)
+        if export.from_store:
+            print(f"  -> Linked from store: {filename}")
+            self.store_hits += 1
+        elif export.written:
+            print(f"  -> Saved to: {filename}")
+        else:
+            print(f"  -> Unchanged: {filename}")
+            self.unchanged_parts += 1
+        if export.digest is not None:
+            entry = self.manifest[filename] = {"name": export.part_name, "digest": export.digest}
+            geometry_hash = export.geometry_hash
+            if geometry_hash and not geometry_hash.startswith(self.UNIQUE_KEY_PREFIX):
+                entry["geometry"] = geometry_hash
+
+        # Timings were measured where the part was exported (possibly a worker process)
+        profiler = self.profiler
+        profiler.add_phase("collect_dependencies", export.collect_seconds)
+        if export.written:
+            profiler.add_phase("write", export.write_seconds)
+        profiler.parts.append({"name": export.part_name, "file": filename, "written": export.written,
+                               "from_store": export.from_store,
+                               "collect_seconds": export.collect_seconds,
+                               "write_seconds": export.write_seconds, "bytes": export.size})
+
+    def _export_part(self, export: PartExport) -> PartExport:
+        """Collect the dependencies of one part and write its STEP file.
+
+        With a part store, a part whose key is already stored is linked from the
+        store without collecting it, and a newly written part is added to the store.
+        In incremental mode the part's digest is computed first -- its content
+        digest, or "store:<key>" with a part store -- and the file is left alone if
+        it exists and the previous manifest has the same digest. With a store, an
+        entry with a content digest (from a run without the store) is compared by
+        content digest, but the new manifest records the store key.
+        """
+        start = time.perf_counter()
+        if self.store is not None and self.output.parallel:
+            # The store key needs the real geometry hash
+            export = self._with_geometry_hash(export)
+            export = self._link_stored_part(export, start)
+            if export.from_store or not export.written:
+                return export
+
+        dependencies, context_id = self._collect_solid_dependencies(export.solid_id)
+        solid_id = export.solid_id if context_id else None
+        if self.previous_manifest is not None:
+            digest = self.writer.content_digest(export.part_name, dependencies, self.parser,
+                                                solid_id=solid_id, context_id=context_id)
+            unchanged = self._is_unchanged(export._replace(digest=digest))
+            if export.store_key is None:
+                export = export._replace(digest=digest)
+            if unchanged:
+                if export.store_key is not None:
+                    self.store.add(export.store_key, export.output_path)
+                return export._replace(written=False, collect_seconds=time.perf_counter() - start)
+        collected = time.perf_counter()
+        with self.output.open(export.output_path) as stream:
+            self.writer.write_step_stream(stream, export.part_name, dependencies, self.parser,
+                                          solid_id=solid_id, context_id=context_id)
+        if export.store_key is not None:
+            self.store.add(export.store_key, export.output_path)
+        size = os.path.getsize(export.output_path) if self.output.parallel else 0
+        return export._replace(collect_seconds=collected - start,
+                               write_seconds=time.perf_counter() - collected, size=size)
+
+    def _link_stored_part(self, export: PartExport, start: float) -> PartExport:
+        """Set the part's store key and link it from the store if it is there (sets from_store)."""
+        key = PartStore.key(self.hash_mode, export.geometry_hash, export.part_name)
+        export = export._replace(store_key=key)
+        if self.previous_manifest is not None:
+            export = export._replace(digest=f"store:{key}")
+            if self._is_unchanged(export):
+                self.store.add(key, export.output_path)
+                return export._replace(written=False, collect_seconds=time.perf_counter() - start)
+        hashed = time.perf_counter()
+        if not self.store.fetch(key, export.output_path):
+            return export
+        return export._replace(from_store=True, collect_seconds=hashed - start,
+                               write_seconds=time.perf_counter() - hashed,
+                               size=os.path.getsize(export.output_path))
+
+    def _with_geometry_hash(self, export: PartExport) -> PartExport:
+        """Fill in the geometry hash of a part told apart by its signature alone (or never hashed)."""
+        geometry_hash = export.geometry_hash
+        if not geometry_hash or geometry_hash.startswith(self.UNIQUE_KEY_PREFIX):
+            export = export._replace(geometry_hash=self.hasher.compute_geometry_hash(export.solid_id))
+        return export
+
+    def _is_unchanged(self, export: PartExport) -> bool:
+        """Whether the part file exists and has the same digest in the previous manifest."""
+        previous = self.previous_manifest.get(os.path.basename(export.output_path))
+        return bool(previous and previous.get("digest") == export.digest and os.path.exists(export.output_path))
+
     def _export_single_part(self, output_dir: str, base_name: str, solid_id: int) -> None:
         """Export a single part."""
-        dependencies, context_id = self._collect_solid_dependencies(solid_id)
+        if self.selection and not self._select_solids([solid_id]):
+            print("  No parts match the selection")
+            return
 
         # Try to get part name from the solid body entity itself
         part_name = self._get_solid_name(solid_id)
@@ -708,16 +2676,63 @@ class StepSplitter:
             part_name = f"{base_name}_1"
 
         output_filename = f"{self._sanitize_filename(part_name)}.stp"
-        output_filepath = os.path.join(output_dir, output_filename)
+        output_filepath = self.output.part_path(output_filename)
 
-        print(f"Exporting single part: {part_name}")
-        self.writer.write_step_file(output_filepath, part_name, dependencies, self.parser,
-                                    solid_id=solid_id if context_id else None,
-                                    context_id=context_id)
-        print(f"  -> Saved to: {output_filename}")
+        self._export_parts([PartExport(solid_id, part_name, output_filepath,
+                                       f"Exporting single part: {part_name}")])
 
         self.part_report.append((part_name, 1))
 
+    def _read_manifest(self, manifest_path: str) -> Dict[str, dict]:
+        """Load the part manifest of a previous incremental run (empty if missing or unreadable)."""
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get("version") != self.MANIFEST_VERSION:
+            return {}
+        return manifest.get("parts", {})
+
+    def _finish_incremental(self, output_dir: str, manifest_path: str,
+                            report: List[tuple]) -> List[tuple]:
+        """Delete parts of the previous run that no longer exist and save the new manifest.
+
+        Each manifest entry keeps the part's report row. With a selection, parts
+        outside it were not exported: their previous manifest entries are kept,
+        nothing is deleted, and the returned report rows include the kept parts.
+        """
+        report = list(report)
+        if len(report) == len(self.manifest):
+            for entry, row in zip(self.manifest.values(), report):
+                entry["report"] = list(row)
+        written = len(self.manifest) - self.unchanged_parts
+        removed = 0
+        for filename, entry in self.previous_manifest.items():
+            if filename in self.manifest:
+                continue
+            if os.path.basename(filename) != filename or filename in ("", ".", ".."):
+                # Not a part file name (edited or corrupt manifest): never delete outside output_dir
+                print(f"Ignoring invalid manifest entry: {filename!r}")
+                continue
+            if self.selection:
+                self.manifest[filename] = entry
+                if isinstance(entry, dict) and isinstance(entry.get("report"), list):
+                    report.append(tuple(entry["report"]))
+                continue
+            path = os.path.join(output_dir, filename)
+            if os.path.isfile(path):
+                os.remove(path)
+                print(f"Removed stale part: {filename}")
+                removed += 1
+
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.MANIFEST_VERSION, "parts": self.manifest}, f, indent=1, sort_keys=True)
+
+        print(f"Incremental update: {written} written, "
+              f"{self.unchanged_parts} unchanged, {removed} removed")
+        return report
+
     def _get_solid_name(self, solid_id: int) -> Optional[str]:
         """Extract the name directly from a solid body entity (MANIFOLD_SOLID_BREP or BREP_WITH_VOIDS)."""
         entity = self.parser.entities.get(solid_id)
@@ -734,63 +2749,11 @@ class StepSplitter:
 
     def _find_product_for_solid(self, solid_id: int) -> Optional[str]:
         """Find the product name associated with a solid body."""
-        pd = self._find_product_definition_entity_for_solid(solid_id)
-        if pd:
-            return self._extract_product_name(pd)
-        return None
+        return self.structure.product_name(self.structure.pd_of.get(solid_id))
 
     def _find_product_definition_for_solid(self, solid_id: int) -> Optional[int]:
         """Find the PRODUCT_DEFINITION entity ID for a solid body."""
-        pd = self._find_product_definition_entity_for_solid(solid_id)
-        return pd.id if pd else None
-
-    def _find_product_definition_entity_for_solid(self, solid_id: int) -> Optional[StepEntity]:
-        """Find the PRODUCT_DEFINITION entity associated with a solid body."""
-        # Find ADVANCED_BREP_SHAPE_REPRESENTATION containing this solid
-        for abrep_id in self.parser.find_entities_by_type("ADVANCED_BREP_SHAPE_REPRESENTATION"):
-            abrep = self.parser.entities.get(abrep_id)
-            if abrep and solid_id in abrep.references:
-                # Method 1: Direct - Find SHAPE_DEFINITION_REPRESENTATION referencing this ABREP
-                for sdr_id in self.parser.find_entities_by_type("SHAPE_DEFINITION_REPRESENTATION"):
-                    sdr = self.parser.entities.get(sdr_id)
-                    if sdr and abrep_id in sdr.references:
-                        pd = self._get_product_definition_from_sdr(sdr)
-                        if pd:
-                            return pd
-
-                # Method 2: Via SHAPE_REPRESENTATION_RELATIONSHIP
-                # Some STEP files link ADVANCED_BREP_SHAPE_REPRESENTATION to SHAPE_REPRESENTATION
-                # via SHAPE_REPRESENTATION_RELATIONSHIP, then SDR references the SHAPE_REPRESENTATION
-                for srr_id in self.parser.find_entities_by_type("SHAPE_REPRESENTATION_RELATIONSHIP"):
-                    srr = self.parser.entities.get(srr_id)
-                    if srr and abrep_id in srr.references:
-                        # Find the SHAPE_REPRESENTATION also referenced by this relationship
-                        for shape_rep_id in srr.references:
-                            if shape_rep_id == abrep_id:
-                                continue
-                            shape_rep = self.parser.entities.get(shape_rep_id)
-                            if shape_rep and shape_rep.type == "SHAPE_REPRESENTATION":
-                                # Find SDR referencing this SHAPE_REPRESENTATION
-                                for sdr_id in self.parser.find_entities_by_type("SHAPE_DEFINITION_REPRESENTATION"):
-                                    sdr = self.parser.entities.get(sdr_id)
-                                    if sdr and shape_rep_id in sdr.references:
-                                        pd = self._get_product_definition_from_sdr(sdr)
-                                        if pd:
-                                            return pd
-        return None
-
-    def _get_product_definition_from_sdr(self, sdr: StepEntity) -> Optional[StepEntity]:
-        """Extract PRODUCT_DEFINITION from a SHAPE_DEFINITION_REPRESENTATION."""
-        # Find PRODUCT_DEFINITION_SHAPE referenced by SDR
-        for ref in sdr.references:
-            pds = self.parser.entities.get(ref)
-            if pds and pds.type == "PRODUCT_DEFINITION_SHAPE":
-                # Find PRODUCT_DEFINITION referenced by PDS
-                for pds_ref in pds.references:
-                    pd = self.parser.entities.get(pds_ref)
-                    if pd and pd.type == "PRODUCT_DEFINITION":
-                        return pd
-        return None
+        return self.structure.pd_of.get(solid_id)
 
     def _collect_solid_dependencies(self, solid_id: int) -> Tuple[Set[int], Optional[int]]:
         """Collect all entities required for a solid body, including product structure.
@@ -807,166 +2770,71 @@ class StepSplitter:
 
         # Add ADVANCED_BREP_SHAPE_REPRESENTATION that contains this solid
         # This provides the geometric context and units needed by OpenCASCADE
-        abrep_id_found = None
-
-        # Get all solid body IDs so we can exclude them when processing ABREP references
-        all_solid_ids = set(self._find_all_solid_bodies())
-
-        for abrep_id in self.parser.find_entities_by_type("ADVANCED_BREP_SHAPE_REPRESENTATION"):
-            abrep = self.parser.entities.get(abrep_id)
-            if abrep and solid_id in abrep.references:
-                abrep_id_found = abrep_id
-
-                # Check if this ABREP contains multiple solids
-                solids_in_abrep = [ref for ref in abrep.references if ref in all_solid_ids]
-
-                if len(solids_in_abrep) > 1:
-                    # Multiple solids share this ABREP - don't include it directly
-                    # Extract context/units for creating a synthetic ABREP
-                    for ref in abrep.references:
-                        if ref not in all_solid_ids:
-                            # This is the geometric context
-                            context_id = ref
-                            required.add(ref)
-                            required.update(self.parser.get_transitive_dependencies(ref))
-                else:
-                    # Single solid in ABREP - include it as-is
-                    required.add(abrep_id)
-                    for ref in abrep.references:
-                        if ref != solid_id:
-                            required.add(ref)
-                            required.update(self.parser.get_transitive_dependencies(ref))
-                break
+        abrep_id = self.structure.abrep_of.get(solid_id)
+
+        # All solid body IDs, so we can exclude them when processing ABREP references
+        all_solid_ids = self.structure.solid_ids
+
+        if abrep_id is not None:
+            abrep = self.parser.entities[abrep_id]
+
+            # Check if this ABREP contains multiple solids
+            solids_in_abrep = [ref for ref in abrep.references if ref in all_solid_ids]
+
+            if len(solids_in_abrep) > 1:
+                # Multiple solids share this ABREP - don't include it directly
+                # Extract context/units for creating a synthetic ABREP
+                for ref in abrep.references:
+                    if ref not in all_solid_ids:
+                        # This is the geometric context
+                        context_id = ref
+                        required.add(ref)
+                        required.update(self.parser.get_transitive_dependencies(ref))
+            else:
+                # Single solid in ABREP - include it as-is
+                required.add(abrep_id)
+                for ref in abrep.references:
+                    if ref != solid_id:
+                        required.add(ref)
+                        required.update(self.parser.get_transitive_dependencies(ref))
 
         # Add product structure entities (PRODUCT_DEFINITION, PRODUCT, etc.)
-        self._add_product_structure(required, solid_id, abrep_id_found)
+        required.update(self.structure.product_structure(abrep_id))
 
         # Add styling for this specific solid only
         self._add_styled_items_for_solid(required, solid_id)
 
         return required, context_id
 
-    def _add_product_structure(self, entities: Set[int], solid_id: int,
-                                abrep_id: Optional[int]) -> None:
-        """Add PRODUCT_DEFINITION and related entities for a solid body.
-
-        This creates the product wrapper that OpenCASCADE requires:
-        APPLICATION_CONTEXT -> PRODUCT_DEFINITION_CONTEXT -> PRODUCT_DEFINITION
-        -> PRODUCT_DEFINITION_FORMATION -> PRODUCT
-        -> PRODUCT_DEFINITION_SHAPE -> SHAPE_DEFINITION_REPRESENTATION
-        """
-        if not abrep_id:
-            return
-
-        # Find SHAPE_REPRESENTATION linked to this ABREP
-        # Method 1: Direct SDR referencing ABREP
-        for sdr_id in self.parser.find_entities_by_type("SHAPE_DEFINITION_REPRESENTATION"):
-            sdr = self.parser.entities.get(sdr_id)
-            if sdr and abrep_id in sdr.references:
-                entities.add(sdr_id)
-                self._add_sdr_chain(entities, sdr)
-                return
-
-        # Method 2: Via SHAPE_REPRESENTATION_RELATIONSHIP
-        for srr_id in self.parser.find_entities_by_type("SHAPE_REPRESENTATION_RELATIONSHIP"):
-            srr = self.parser.entities.get(srr_id)
-            if srr and abrep_id in srr.references:
-                entities.add(srr_id)
-                # Find SHAPE_REPRESENTATION linked by this relationship
-                for shape_rep_id in srr.references:
-                    if shape_rep_id == abrep_id:
-                        continue
-                    shape_rep = self.parser.entities.get(shape_rep_id)
-                    if shape_rep and shape_rep.type == "SHAPE_REPRESENTATION":
-                        entities.add(shape_rep_id)
-                        entities.update(self.parser.get_transitive_dependencies(shape_rep_id))
-                        # Find SDR referencing this SHAPE_REPRESENTATION
-                        for sdr_id in self.parser.find_entities_by_type("SHAPE_DEFINITION_REPRESENTATION"):
-                            sdr = self.parser.entities.get(sdr_id)
-                            if sdr and shape_rep_id in sdr.references:
-                                entities.add(sdr_id)
-                                self._add_sdr_chain(entities, sdr)
-                                return
-
-    def _add_sdr_chain(self, entities: Set[int], sdr: StepEntity) -> None:
-        """Add the full product chain from a SHAPE_DEFINITION_REPRESENTATION."""
-        for ref in sdr.references:
-            pds = self.parser.entities.get(ref)
-            if pds and pds.type == "PRODUCT_DEFINITION_SHAPE":
-                entities.add(pds.id)
-                # Get PRODUCT_DEFINITION
-                for pds_ref in pds.references:
-                    pd = self.parser.entities.get(pds_ref)
-                    if pd and pd.type == "PRODUCT_DEFINITION":
-                        entities.add(pd.id)
-                        # Add all transitive deps of PRODUCT_DEFINITION
-                        # (PRODUCT_DEFINITION_FORMATION, PRODUCT, PRODUCT_CONTEXT,
-                        #  APPLICATION_CONTEXT, APPLICATION_PROTOCOL_DEFINITION, etc.)
-                        entities.update(self.parser.get_transitive_dependencies(pd.id))
-
-                        # Also find PROPERTY_DEFINITION entities referencing this PD
-                        for prop_id in self.parser.find_entities_by_type("PROPERTY_DEFINITION"):
-                            prop = self.parser.entities.get(prop_id)
-                            if prop and pd.id in prop.references:
-                                entities.add(prop_id)
-                                entities.update(self.parser.get_transitive_dependencies(prop_id))
-                                # Find PROPERTY_DEFINITION_REPRESENTATION
-                                for pdr_id in self.parser.find_entities_by_type("PROPERTY_DEFINITION_REPRESENTATION"):
-                                    pdr = self.parser.entities.get(pdr_id)
-                                    if pdr and prop_id in pdr.references:
-                                        entities.add(pdr_id)
-                                        entities.update(self.parser.get_transitive_dependencies(pdr_id))
-
     def _add_styled_items_for_solid(self, entities: Set[int], solid_id: int) -> None:
         """Add STYLED_ITEM and its styling dependencies for a specific solid only."""
         # STYLED_ITEM can reference the solid directly OR any entity within its geometry tree
-        # (e.g., ADVANCED_FACE entities)
-        geo_deps = self.parser.get_transitive_dependencies(solid_id)
-
-        for styled_item_id in self.parser.find_entities_by_type("STYLED_ITEM"):
-            styled_item = self.parser.entities.get(styled_item_id)
-            if styled_item:
-                # Check if any of the styled item's references are in our geometry
-                if styled_item.references & geo_deps:
-                    entities.add(styled_item_id)
-                    # Add only the styling chain (not the geometry which is already included)
-                    for ref in styled_item.references:
-                        if ref not in geo_deps:
-                            entities.add(ref)
-                            entities.update(self.parser.get_transitive_dependencies(ref))
-
-    def _extract_product_name(self, product_def: StepEntity) -> Optional[str]:
-        """Extract product name from PRODUCT_DEFINITION."""
-        for ref in product_def.references:
-            pdf_entity = self.parser.entities.get(ref)
-            if pdf_entity and pdf_entity.type in (
-                "PRODUCT_DEFINITION_FORMATION_WITH_SPECIFIED_SOURCE",
-                "PRODUCT_DEFINITION_FORMATION"
-            ):
-                for prod_ref in pdf_entity.references:
-                    product = self.parser.entities.get(prod_ref)
-                    if product and product.type == "PRODUCT":
-                        match = re.search(r"'([^']+)'", product.content)
-                        if match:
-                            return match.group(1)
-        return None
+        # (e.g., ADVANCED_FACE entities); the geometry itself is already included
+        self.styles.add_styling(entities, self.parser.get_transitive_dependencies(solid_id))
 
     def _sanitize_filename(self, name: str) -> str:
         """Sanitize a string for use as a filename."""
         return re.sub(r'[^a-zA-Z0-9_\-]', '_', name)
 
-    def _write_report(self, output_dir: str, base_name: str) -> None:
+    def _report_rows(self) -> List[tuple]:
+        """Return the report rows of this run: (name, count), plus the store key with a part store."""
+        report = self.part_report
+        if self.store is not None and any(self.store_keys) and len(self.store_keys) == len(report):
+            report = [(name, count, key) for (name, count), key in zip(report, self.store_keys)]
+        return list(report)
+
+    def _write_report(self, output_dir: str, base_name: str, report: List[tuple]) -> None:
         """Write a report file listing all parts and their counts."""
         report_filename = f"{base_name}.txt"
         # Report file goes inside the SPLIT folder
         report_filepath = os.path.join(output_dir, report_filename)
 
         # Sort by part name
-        sorted_report = sorted(self.part_report, key=lambda x: x[0])
+        sorted_report = sorted(report, key=lambda x: str(x[0]))
 
         lines = []
-        for part_name, count in sorted_report:
-            lines.append(f"{part_name};{count}")
+        for entry in sorted_report:
+            lines.append(";".join(str(field) for field in entry))
 
         with open(report_filepath, 'w', encoding='utf-8') as f:
             f.write('\n'.join(lines))
@@ -974,45 +2842,588 @@ class StepSplitter:
         print(f"\nReport saved to: {report_filename}")
 
 
+class BatchJob(NamedTuple):
+    """One input file of a batch run and where its parts go."""
+    input_path: str
+    output_dir: str
+    options: dict
+
+
+class BatchResult(NamedTuple):
+    """Outcome of splitting one batch input."""
+    input_path: str
+    output_dir: str
+    ok: bool
+    parts: int
+    instances: int
+    seconds: float
+    error: str
+
+
+def _split_file_in_worker(job: BatchJob) -> BatchResult:
+    """Split one batch input, logging to <output_dir>/<name>.log; errors are returned, not raised."""
+    start = time.perf_counter()
+    base_name = os.path.splitext(os.path.basename(job.input_path))[0]
+    splitter = StepSplitter(**job.options)
+    try:
+        os.makedirs(job.output_dir, exist_ok=True)
+        with open(os.path.join(job.output_dir, f"{base_name}.log"), 'w', encoding='utf-8') as log:
+            with redirect_stdout(log):
+                splitter.split(job.input_path, job.output_dir)
+    except Exception as e:
+        return BatchResult(job.input_path, job.output_dir, False, 0, 0,
+                           time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return BatchResult(job.input_path, job.output_dir, True, len(splitter.part_report),
+                       sum(count for _, count in splitter.part_report), time.perf_counter() - start, "")
+
+
+class BatchSplitter:
+    """Splits many STEP files on a process pool, one file per worker at a time.
+
+    Inputs can be directories (searched recursively), glob patterns, STEP files,
+    or manifest files listing one path or pattern per line. Files are scheduled
+    largest first so the long runs start early. A failing file is reported in
+    the summary and does not stop the others.
+    """
+
+    STEP_EXTENSIONS = (".stp", ".step", ".p21")
+    SUMMARY_FILENAME = "batch-summary.txt"
+
+    def __init__(self, jobs: int = 1, **splitter_options):
+        self.jobs = jobs
+        self.splitter_options = splitter_options
+
+    def collect_inputs(self, sources: Iterable[str]) -> List[str]:
+        """Expand directories, globs and manifests into a list of unique STEP files."""
+        found: Dict[str, None] = {}
+        for source in sources:
+            for path in self._expand(source):
+                found[os.path.abspath(path)] = None
+        return list(found)
+
+    def _expand(self, source: str) -> Iterator[str]:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                # Skip split results of earlier runs
+                dirs[:] = sorted(d for d in dirs if not d.startswith("SPLIT-"))
+                for name in sorted(files):
+                    if name.lower().endswith(self.STEP_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(source) and not source.lower().endswith(self.STEP_EXTENSIONS):
+            # Manifest: one path or pattern per line, relative to the manifest's directory
+            base_dir = os.path.dirname(source)
+            with open(source, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield from self._expand(os.path.join(base_dir, line))
+        elif os.path.isfile(source):
+            yield source
+        else:
+            for path in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(self.STEP_EXTENSIONS):
+                    yield path
+                elif os.path.isdir(path):
+                    yield from self._expand(path)
+
+    def plan(self, input_paths: List[str], output_root: Optional[str] = None) -> List[BatchJob]:
+        """Assign output directories (SPLIT-<name>, made unique) and order jobs largest first."""
+        jobs = []
+        used: Set[str] = set()
+        for path in sorted(input_paths, key=os.path.getsize, reverse=True):
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            parent = output_root or os.path.dirname(path)
+            output_dir = os.path.join(parent, f"SPLIT-{base_name}")
+            suffix = 2
+            while output_dir in used:
+                output_dir = os.path.join(parent, f"SPLIT-{base_name}-{suffix}")
+                suffix += 1
+            used.add(output_dir)
+            jobs.append(BatchJob(path, output_dir, self.splitter_options))
+        return jobs
+
+    def run(self, sources: Iterable[str], output_root: Optional[str] = None) -> List[BatchResult]:
+        """Split every input and write the combined summary; returns results in input order."""
+        jobs = self.plan(self.collect_inputs(sources), output_root)
+        print(f"Batch: {len(jobs)} STEP files on {min(self.jobs, max(len(jobs), 1))} worker processes")
+
+        results: Dict[str, BatchResult] = {}
+        if self.jobs > 1 and len(jobs) > 1:
+            with multiprocessing.Pool(min(self.jobs, len(jobs))) as pool:
+                for result in pool.imap_unordered(_split_file_in_worker, jobs):
+                    results[result.input_path] = result
+                    self._print_result(result)
+        else:
+            for job in jobs:
+                result = _split_file_in_worker(job)
+                results[result.input_path] = result
+                self._print_result(result)
+
+        ordered = [results[path] for path in sorted(results)]
+        if ordered:
+            summary_dir = output_root or os.getcwd()
+            os.makedirs(summary_dir, exist_ok=True)
+            self._write_summary(os.path.join(summary_dir, self.SUMMARY_FILENAME), ordered)
+        failed = sum(1 for result in ordered if not result.ok)
+        print(f"\nBatch completed: {len(ordered) - failed} succeeded, {failed} failed")
+        return ordered
+
+    @staticmethod
+    def _print_result(result: BatchResult) -> None:
+        if result.ok:
+            print(f"  OK     {result.input_path}: {result.parts} parts, "
+                  f"{result.instances} instances ({result.seconds:.1f}s)")
+        else:
+            print(f"  FAILED {result.input_path}: {result.error}")
+
+    @staticmethod
+    def _write_summary(summary_path: str, results: List[BatchResult]) -> None:
+        """Write one line per input: input;status;parts;instances;seconds;output_dir;error."""
+        lines = ["input;status;parts;instances;seconds;output_dir;error"]
+        for result in results:
+            status = "ok" if result.ok else "failed"
+            error = result.error.replace(';', ',').replace('\n', ' ')
+            lines.append(f"{result.input_path};{status};{result.parts};{result.instances};"
+                         f"{result.seconds:.2f};{result.output_dir};{error}")
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        print(f"\nBatch summary saved to: {summary_path}")
+
+
+class _ThreadStdout(io.TextIOBase):
+    """sys.stdout replacement that sends each thread's output to its own target, if set."""
+
+    def __init__(self, default: TextIO):
+        self.default = default
+        self._local = threading.local()
+
+    def set_target(self, target: Optional[TextIO]) -> None:
+        self._local.target = target
+
+    def write(self, text: str) -> int:
+        target = getattr(self._local, 'target', None) or self.default
+        return target.write(text)
+
+    def flush(self) -> None:
+        target = getattr(self._local, 'target', None) or self.default
+        target.flush()
+
+
+class _EventWriter(io.TextIOBase):
+    """Text stream turning printed lines into ("log", line) events of a job."""
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        self._partial = ""
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self.events.put(("log", line))
+        return len(text)
+
+    def flush(self) -> None:
+        if self._partial:
+            self.events.put(("log", self._partial))
+            self._partial = ""
+
+
+class SplitService:
+    """Long-running splitter: a bounded job queue, worker threads, and an LRU of parsed files.
+
+    A job is a dict with "input" (path) and optionally "output_dir", "hash",
+    "format", "compress_level", "incremental", and the PartSelection lists
+    "parts", "pd" and "subtree". Its progress lines and final
+    result are delivered as events through a per-job queue. Parsed files are
+    kept in memory (keyed by path, size and mtime) so repeated splits of the
+    same file skip parsing; jobs on the same file run one at a time. Each job
+    runs on its worker thread without worker processes (--workers sets the
+    parallelism). Progress lines reach the events only inside capture_output().
+    """
+
+    WORKERS = 2
+    QUEUE_SIZE = 16
+    MAX_PARSED_FILES = 4
+
+    # Job fields holding PartSelection lists -> type of their items and its description
+    SELECTION_FIELDS = {"parts": (str, "strings"), "pd": (int, "integers"), "subtree": (str, "strings")}
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                 max_parsed_files: int = MAX_PARSED_FILES, lazy: bool = False,
+                 cache: Optional[ParseCache] = None, store: Optional[PartStore] = None):
+        self.lazy = lazy
+        self.cache = cache
+        self.store = store
+        self.max_parsed_files = max_parsed_files
+        self._jobs: queue.Queue = queue.Queue(maxsize=queue_size)
+        # (path, size, mtime_ns) -> parsed file, least recently used first
+        self._parsed: Dict[Tuple[str, int, int], '_ParsedFile'] = OrderedDict()
+        self._parsed_lock = threading.Lock()
+        self._stdout = _ThreadStdout(sys.stdout)
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(max(workers, 1))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, request: dict) -> queue.Queue:
+        """Queue a job; returns its event queue. Raises queue.Full if the queue is full."""
+        if not isinstance(request, dict) or not isinstance(request.get("input"), str):
+            raise ValueError('Job must be a JSON object with an "input" path')
+        if not isinstance(request.get("output_dir") or "", str):
+            raise ValueError('"output_dir" must be a path')
+        for field, (item_type, description) in self.SELECTION_FIELDS.items():
+            items = request.get(field, [])
+            if not isinstance(items, list) or not all(
+                    isinstance(item, item_type) and not isinstance(item, bool) for item in items):
+                raise ValueError(f'"{field}" must be a list of {description}')
+        events: queue.Queue = queue.Queue()
+        self._jobs.put_nowait((request, events))
+        return events
+
+    @contextmanager
+    def capture_output(self) -> Iterator[None]:
+        """Install a sys.stdout that sends each job's output to its events; restore the old one on exit."""
+        previous = sys.stdout
+        self._stdout.default = previous
+        sys.stdout = self._stdout
+        try:
+            yield
+        finally:
+            sys.stdout = previous
+
+    def status(self) -> dict:
+        """Return the number of waiting jobs, the worker count and the files kept parsed."""
+        with self._parsed_lock:
+            parsed = [key[0] for key, entry in self._parsed.items() if entry.parser is not None]
+        return {"queued": self._jobs.qsize(), "workers": len(self._workers), "parsed_files": parsed}
+
+    def _work(self) -> None:
+        while True:
+            request, events = self._jobs.get()
+            writer = _EventWriter(events)
+            self._stdout.set_target(writer)
+            try:
+                result = self._run(request)
+            except Exception as e:
+                writer.flush()
+                events.put(("error", f"{type(e).__name__}: {e}"))
+            else:
+                writer.flush()
+                events.put(("done", result))
+            finally:
+                self._stdout.set_target(None)
+                self._jobs.task_done()
+
+    def _run(self, request: dict) -> dict:
+        start = time.perf_counter()
+        input_path = os.path.abspath(request["input"])
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        output_dir = request.get("output_dir") or os.path.join(os.path.dirname(input_path),
+                                                                f"SPLIT-{base_name}")
+        # Jobs run serially on their worker thread: forking from a multithreaded
+        # process could copy locks held by other threads into the child
+        splitter = StepSplitter(lazy=self.lazy, jobs=1,
+                                hash_mode=request.get("hash", "flat"),
+                                output_format=request.get("format", "stp"),
+                                compress_level=int(request.get("compress_level", PartOutput.COMPRESS_LEVEL)),
+                                incremental=bool(request.get("incremental", False)),
+                                selection=PartSelection(request.get("parts", ()), request.get("pd", ()),
+                                                        request.get("subtree", ())),
+                                store=self.store)
+        if splitter.hash_mode not in StepSplitter.HASH_MODES:
+            raise ValueError(f"Unknown hash mode: {splitter.hash_mode}")
+
+        entry = self._parsed_entry(input_path)
+        with entry.lock:
+            if entry.parser is None:
+                print(f"Parsing STEP file: {input_path}")
+                parser = StepParser(lazy=self.lazy, cache=self.cache)
+                parser.parse(input_path)
+                entry.parser = parser
+            else:
+                print(f"Using parsed STEP file: {input_path}")
+            splitter.parser = entry.parser
+            splitter.split_parsed(output_dir)
+        return {"input": input_path, "output_dir": output_dir,
+                "report": sorted(splitter.part_report), "seconds": round(time.perf_counter() - start, 3)}
+
+    def _parsed_entry(self, input_path: str) -> '_ParsedFile':
+        """Return the LRU entry of the current version of a file (created empty if new)."""
+        st = os.stat(input_path)
+        key = (input_path, st.st_size, st.st_mtime_ns)
+        with self._parsed_lock:
+            entry = self._parsed.get(key)
+            if entry is None:
+                entry = self._parsed[key] = _ParsedFile()
+                while len(self._parsed) > self.max_parsed_files:
+                    self._parsed.popitem(last=False)
+            else:
+                self._parsed.move_to_end(key)
+        return entry
+
+
+class _ParsedFile:
+    """A SplitService LRU entry: the parser of one file version and the lock serializing its jobs."""
+
+    __slots__ = ('lock', 'parser')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parser: Optional[StepParser] = None
+
+
+class _SplitRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API of SplitService.
+
+    POST /split with a JSON job streams back newline-delimited JSON events:
+    {"event": "log", "line": ...} for each progress line, then
+    {"event": "done", "result": {...}} with the part report, or
+    {"event": "error", "message": ...}. GET /status returns queue and LRU state.
+    """
+
+    service: SplitService = None
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/') == "/status":
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self) -> None:
+        if self.path.rstrip('/') != "/split":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            events = self.service.submit(json.loads(self.rfile.read(length) or b"{}"))
+        except queue.Full:
+            self._send_json(503, {"error": "Job queue is full"})
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        while True:
+            kind, payload = events.get()
+            if kind == "log":
+                event = {"event": "log", "line": payload}
+            elif kind == "done":
+                event = {"event": "done", "result": payload}
+            else:
+                event = {"event": "error", "message": payload}
+            self.wfile.write(json.dumps(event).encode('utf-8') + b"\n")
+            self.wfile.flush()
+            if kind != "log":
+                break
+
+    def _send_json(self, code: int, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(address: str, service: SplitService) -> None:
+    """Serve the SplitService HTTP API on [HOST:]PORT, or on a Unix socket if address is a path."""
+    handler = type("SplitRequestHandler", (_SplitRequestHandler,), {"service": service})
+    if os.sep in address or address.endswith(".sock"):
+        if os.path.lexists(address):
+            # Only replace a stale socket; never delete some other file at that path
+            if not stat.S_ISSOCK(os.lstat(address).st_mode):
+                raise FileExistsError(f"{address} exists and is not a socket")
+            os.remove(address)
+        server = _UnixHTTPServer(address, handler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+    print(f"Serving STEP splitter on {address} (POST /split, GET /status)", file=sys.stderr)
+    try:
+        with service.capture_output():
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def print_usage() -> None:
+    print("STEP File Splitter")
+    print("==================")
+    print("Splits STEP assembly files into individual part files,")
+    print("or multi-volume parts into separate volume files.")
+    print()
+    print("Features:")
+    print("- Detects and merges duplicate parts (creates one file with count)")
+    print("- Generates report file listing all parts and their counts")
+    print()
+    print("Usage: python3 step_splitter.py [options] <input.stp> [output_directory]")
+    print()
+    print("Arguments:")
+    print("  input.stp        - Path to the STEP file to split")
+    print("  output_directory - Optional: Directory for output files")
+    print("                     (defaults to 'RESULT' in input file's directory)")
+    print()
+    print("Options:")
+    print("  --lazy           - Memory-map the input and decode entities on demand")
+    print("                     (for multi-gigabyte files)")
+    print("  --jobs N         - Hash and export parts on N worker processes")
+    print("  --hash MODE      - Duplicate detection hash: 'flat' (default), 'merkle'")
+    print("                     (structure-aware, each entity hashed once) or")
+    print("                     'placement' (merges translated/rotated copies)")
+    print("  --format FORMAT  - Part output: 'stp' (default), 'stpZ' (gzip per part),")
+    print("                     'zip' or 'tar' (one archive per input)")
+    print("  --compress-level N - Compression level 0-9 for stpZ/zip/tar (default 6)")
+    print("  --cache          - Reuse parse results of unchanged files from an on-disk cache")
+    print("  --cache-dir DIR  - Cache directory (default ~/.cache/step_splitter; implies --cache)")
+    print("  --cache-size MB  - Evict least recently used cache entries above this size (default 2048)")
+    print("  --incremental    - Only rewrite parts that changed since the last run, delete")
+    print("                     removed ones (tracked in <name>.manifest.json)")
+    print("  --store DIR      - Link parts already in this content-addressed part store instead")
+    print("                     of writing them again; add newly written parts to it")
+    print("  --batch          - Split every STEP file of a directory, glob or manifest file")
+    print("                     (one file per worker with --jobs; output_directory is the root)")
+    print("  --part PATTERN   - Only split parts whose name matches (e.g. 'BOLT*'; repeatable)")
+    print("  --pd ID          - Only split parts at or below PRODUCT_DEFINITION #ID (repeatable)")
+    print("  --subtree PATH   - Only split parts below an assembly path, e.g. 'ROBOT/ARM*'")
+    print("  --profile        - Write phase/part timings, counters and peak memory to")
+    print("                     <name>.profile.json next to the report")
+    print("  --cprofile       - Also save cProfile stats of the hot phases to <name>.prof")
+    print("  --serve ADDRESS  - Run as a service on [HOST:]PORT or a Unix socket path:")
+    print("                     POST /split {\"input\": ...} streams progress and the report")
+    print("  --workers N      - Service: jobs run at the same time (default 2)")
+    print("  --queue-size N   - Service: maximum waiting jobs (default 16)")
+    print("  --keep-parsed N  - Service: parsed files kept in memory (default 4)")
+    print()
+    print("Examples:")
+    print("  python3 step_splitter.py assembly.stp")
+    print("  python3 step_splitter.py part.stp ./output")
+    print("  python3 step_splitter.py --lazy huge_assembly.stp")
+    print("  python3 step_splitter.py --batch --jobs 8 ./incoming ./split")
+    print()
+    print("Output:")
+    print("  - Individual .stp files for each unique part/volume")
+    print("  - A .txt report file with part names and counts")
+    print("    (e.g., 'PART_NAME;4' means 4 identical copies)")
+
+
 def main():
     if len(sys.argv) < 2:
-        print("STEP File Splitter")
-        print("==================")
-        print("Splits STEP assembly files into individual part files,")
-        print("or multi-volume parts into separate volume files.")
-        print()
-        print("Features:")
-        print("- Detects and merges duplicate parts (creates one file with count)")
-        print("- Generates report file listing all parts and their counts")
-        print()
-        print("Usage: python3 step_splitter.py <input.stp> [output_directory]")
-        print()
-        print("Arguments:")
-        print("  input.stp        - Path to the STEP file to split")
-        print("  output_directory - Optional: Directory for output files")
-        print("                     (defaults to 'RESULT' in input file's directory)")
-        print()
-        print("Examples:")
-        print("  python3 step_splitter.py assembly.stp")
-        print("  python3 step_splitter.py part.stp ./output")
-        print()
-        print("Output:")
-        print("  - Individual .stp files for each unique part/volume")
-        print("  - A .txt report file with part names and counts")
-        print("    (e.g., 'PART_NAME;4' means 4 identical copies)")
+        print_usage()
+        return
+
+    arg_parser = argparse.ArgumentParser(description="Split STEP files into individual parts or volumes.")
+    arg_parser.add_argument("input_path", nargs="?", help="Path to the STEP file to split")
+    arg_parser.add_argument("output_dir", nargs="?", help="Directory for output files")
+    arg_parser.add_argument("--lazy", action="store_true",
+                            help="Memory-map the input and decode entities on demand")
+    arg_parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                            help="Hash and export parts on N worker processes")
+    arg_parser.add_argument("--hash", choices=sorted(StepSplitter.HASH_MODES), default="flat",
+                            dest="hash_mode", help="Geometry hash used for duplicate detection")
+    arg_parser.add_argument("--format", choices=PartOutput.FORMATS, default="stp", dest="output_format",
+                            help="Write parts as .stp files, gzip .stpZ files, or one zip/tar.gz archive")
+    arg_parser.add_argument("--compress-level", type=int, choices=range(10),
+                            default=PartOutput.COMPRESS_LEVEL, metavar="N",
+                            help="Compression level (0-9) for the stpZ, zip and tar formats")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="Reuse parse results of unchanged files from an on-disk cache")
+    arg_parser.add_argument("--cache-dir", metavar="DIR",
+                            help="Cache directory (default ~/.cache/step_splitter; implies --cache)")
+    arg_parser.add_argument("--cache-size", type=int, default=ParseCache.MAX_BYTES >> 20, metavar="MB",
+                            help="Evict least recently used cache entries above this total size")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="Only rewrite parts that changed since the last run into this directory")
+    arg_parser.add_argument("--store", metavar="DIR",
+                            help="Content-addressed part store shared between runs: link known parts "
+                                 "from it, add new ones")
+    arg_parser.add_argument("--batch", action="store_true",
+                            help="Treat input_path as a directory, glob or manifest of STEP files and "
+                                 "output_dir as the root for their SPLIT-<name> folders")
+    arg_parser.add_argument("--part", action="append", default=[], metavar="PATTERN",
+                            help="Only split parts whose name matches PATTERN (wildcards allowed; repeatable)")
+    arg_parser.add_argument("--pd", action="append", type=int, default=[], metavar="ID",
+                            help="Only split parts at or below PRODUCT_DEFINITION #ID (repeatable)")
+    arg_parser.add_argument("--subtree", action="append", default=[], metavar="PATH",
+                            help="Only split parts below an assembly path of product names, e.g. ROBOT/ARM*")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="Write per-phase timings, counters and per-part timings to <name>.profile.json")
+    arg_parser.add_argument("--cprofile", action="store_true",
+                            help="Also profile the hashing and export phases with cProfile (<name>.prof)")
+    arg_parser.add_argument("--serve", metavar="ADDRESS",
+                            help="Run as a split service on [HOST:]PORT or a Unix socket path")
+    arg_parser.add_argument("--workers", type=int, default=SplitService.WORKERS, metavar="N",
+                            help="Service: number of jobs run at the same time")
+    arg_parser.add_argument("--queue-size", type=int, default=SplitService.QUEUE_SIZE, metavar="N",
+                            help="Service: maximum number of waiting jobs")
+    arg_parser.add_argument("--keep-parsed", type=int, default=SplitService.MAX_PARSED_FILES, metavar="N",
+                            help="Service: number of parsed files kept in memory")
+    args = arg_parser.parse_args()
+
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ParseCache(args.cache_dir, max_bytes=args.cache_size << 20)
+    store = PartStore(args.store) if args.store else None
+    selection = PartSelection(args.part, args.pd, args.subtree)
+
+    if args.serve:
+        if args.jobs > 1:
+            print("Service jobs run on worker threads without worker processes; --jobs is ignored "
+                  "(use --workers)", file=sys.stderr)
+        service = SplitService(workers=args.workers, queue_size=args.queue_size,
+                               max_parsed_files=args.keep_parsed, lazy=args.lazy,
+                               cache=cache, store=store)
+        try:
+            serve(args.serve, service)
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+    if not args.input_path:
+        arg_parser.error("input_path is required")
+
+    if args.batch:
+        # Files are spread over the workers; each file is split serially
+        batch = BatchSplitter(jobs=max(args.jobs, 1), lazy=args.lazy, hash_mode=args.hash_mode,
+                              output_format=args.output_format, compress_level=args.compress_level,
+                              cache=cache, incremental=args.incremental,
+                              selection=selection, profile=args.profile, cprofile=args.cprofile,
+                              store=store)
+        results = batch.run([args.input_path], args.output_dir)
+        if not results or not all(result.ok for result in results):
+            sys.exit(1)
         return
 
-    input_path = sys.argv[1]
+    input_path = args.input_path
     base_name = os.path.splitext(os.path.basename(input_path))[0]
 
-    if len(sys.argv) >= 3:
-        output_dir = sys.argv[2]
+    if args.output_dir:
+        output_dir = args.output_dir
     else:
         parent_dir = os.path.dirname(input_path) or "."
         output_dir = os.path.join(parent_dir, f"SPLIT-{base_name}")
 
     try:
-        splitter = StepSplitter()
+        splitter = StepSplitter(lazy=args.lazy, jobs=max(args.jobs, 1), hash_mode=args.hash_mode,
+                                output_format=args.output_format, compress_level=args.compress_level,
+                                cache=cache, incremental=args.incremental,
+                                selection=selection, profile=args.profile, cprofile=args.cprofile,
+                                store=store)
         splitter.split(input_path, output_dir)
         print("\nSplitting completed successfully!")
     except Exception as e: